@@ -0,0 +1,214 @@
+import threading
+import time
+
+import pandas as pd
+from googleapiclient.errors import HttpError
+
+from attendance_log import parse_row_span
+from schema import format_dates
+from shared_cache import NullCache
+
+SUMMARY_SHEET = 'Attendance Summary'
+KEY_COLUMNS = ["Student Name", "Class", "Parent 1"]
+COUNT_COLUMNS = ["Present", "Absent", "No Class"]
+SUMMARY_HEADERS = KEY_COLUMNS + COUNT_COLUMNS + ["Last Seen"]
+
+# How long the in-process copy is trusted before the summary tab is read again (seconds)
+AGGREGATE_TTL = 60
+# Shared lease held while the summary tab is read, changed and written back
+WRITE_LEASE = "aggregates write"
+
+
+def _log_key(row):
+    # Log rows are [Date, Student Name, Class, Teacher, Parent 1, Status]
+    return (row[1], row[2], row[4])
+
+
+class StudentAggregates:
+    """Materialized per-student attendance counts kept in their own sheet tab.
+
+    Each student (keyed by name, class and first parent number, like the Mark
+    Attendance widgets) has one row with Present / Absent / No Class counts
+    and the last date they appear in the log. Submits apply a delta instead of
+    re-counting, so the summary page is a dictionary lookup.
+
+    Every write bumps the "log" generation of the ``shared`` cache and
+    publishes the new counts there, so other replicas pick them up on their
+    next read instead of re-reading the tab or waiting out the ttl. Writes
+    hold the shared cache's lease, so replicas apply their deltas one at a
+    time; without a shared cache that only holds within one process, and
+    several replicas need one configured to keep their counts exact.
+    """
+
+    def __init__(self, client, spreadsheet_id, log, sheet=SUMMARY_SHEET, ttl=AGGREGATE_TTL, shared=None):
+        self.client = client
+        self.spreadsheet_id = spreadsheet_id
+        self.log = log
+        self.sheet = sheet
+        self.ttl = ttl
+        self.shared = shared or NullCache()
+        self._lock = threading.Lock()
+        self._stats = None
+        self._rows = {}
+        self._has_header = False
+        self._loaded_at = 0.0
+        self._generation = None
+        # Set while old counts are served because the summary tab could not be read
+        self.stale_since = None
+
+    def get(self, name, class_name, parent1):
+        with self._lock:
+            self._refresh()
+            if not self._has_header:
+                # First use (or the tab was deleted): count the existing history once
+                with self.shared.lease(WRITE_LEASE):
+                    self._rebuild()
+            stats = self._stats.get((name, class_name, parent1))
+            return dict(stats) if stats else None
+
+    def due(self):
+        """True when the next get() would read the summary tab."""
+        return (self._stats is None or time.monotonic() - self._loaded_at >= self.ttl
+                or self.shared.generation("log") != self._generation)
+
+    def refresh(self):
+        with self._lock:
+            self._refresh()
+
+    def apply(self, added, removed=()):
+        """Fold freshly written log rows (and the rows they replaced) into the counts."""
+        # Re-read, add and write back under the lease, so another replica's delta is not overwritten
+        with self._lock, self.shared.lease(WRITE_LEASE):
+            self._load()
+            if not self._has_header:
+                # Nothing materialized yet; the log already holds these rows, so count it all
+                self._rebuild()
+                return
+            changed = set()
+            for row, sign in [(r, 1) for r in added] + [(r, -1) for r in removed]:
+                key = _log_key(row)
+                stats = self._stats.setdefault(key, {col: 0 for col in COUNT_COLUMNS} | {"Last Seen": ""})
+                if row[5] in COUNT_COLUMNS:
+                    stats[row[5]] += sign
+                if sign > 0 and row[0] > stats["Last Seen"]:
+                    stats["Last Seen"] = row[0]
+                changed.add(key)
+            self._write(changed)
+            self._publish()
+
+    def rebuild(self):
+        """Recount everything from the log, e.g. after the log was edited by hand."""
+        with self._lock, self.shared.lease(WRITE_LEASE):
+            self._rebuild()
+
+    def _rebuild(self):
+        counts = []
+        for chunk in self.log.iter_chunks():
+            # Key columns are categoricals; observed=True keeps this to the students actually seen
+            grouped = chunk.groupby(KEY_COLUMNS, observed=True)
+            part = chunk.groupby(KEY_COLUMNS + ["Status"], observed=True).size().unstack(fill_value=0)
+            part = part.reindex(columns=COUNT_COLUMNS, fill_value=0)
+            part["Last Seen"] = grouped["Date"].max()
+            counts.append(part)
+
+        self._ensure_sheet()
+        if counts:
+            merged = pd.concat(counts).groupby(level=KEY_COLUMNS, observed=True)
+            table = merged[COUNT_COLUMNS].sum().join(format_dates(merged["Last Seen"].max()))
+            rows = [list(key) + [int(v) for v in values[:-1]] + [values[-1]]
+                    for key, values in zip(table.index, table.values.tolist())]
+        else:
+            rows = []
+        values = self.client.spreadsheets().values()
+        self.client.execute(values.clear(spreadsheetId=self.spreadsheet_id, range=self.sheet))
+        self.client.execute(values.update(
+            spreadsheetId=self.spreadsheet_id, range=f"{self.sheet}!A1",
+            valueInputOption="RAW", body={"values": [SUMMARY_HEADERS] + rows}))
+        self._load()
+        self._publish()
+
+    def _refresh(self):
+        generation = self.shared.generation("log")
+        if (self._stats is not None and time.monotonic() - self._loaded_at < self.ttl
+                and generation == self._generation):
+            return
+        # Counts another replica just wrote (or read) are as good as reading the tab
+        snapshot = self.shared.get("aggregates", generation)
+        if snapshot is not None and time.time() - snapshot[3] < self.ttl:
+            self._stats, self._rows, self._has_header, _ = snapshot
+            self._loaded_at = time.monotonic()
+        else:
+            try:
+                self._load()
+            except Exception:
+                if self._stats is None:
+                    raise
+                self.stale_since = self.stale_since or time.time()
+                self._generation = generation
+                self._loaded_at = time.monotonic()
+                return
+            self.shared.set("aggregates", generation,
+                            (self._stats, self._rows, self._has_header, time.time()))
+        self.stale_since = None
+        self._generation = generation
+
+    def _publish(self):
+        # The invalidation message for every replica, followed by the counts that answer it
+        self._generation = self.shared.bump("log")
+        self.shared.set("aggregates", self._generation, (self._stats, self._rows, self._has_header, time.time()))
+
+    def _load(self):
+        values = self.client.spreadsheets().values()
+        try:
+            result = self.client.execute(values.get(spreadsheetId=self.spreadsheet_id, range=self.sheet))
+        except HttpError as e:
+            # A missing tab is reported as an unparsable range
+            if e.resp.status != 400:
+                raise
+            result = {}
+        rows = result.get("values", [])
+        self._stats = {}
+        self._rows = {}
+        self._has_header = bool(rows)
+        for offset, row in enumerate(rows[1:]):
+            row = (row + [""] * len(SUMMARY_HEADERS))[:len(SUMMARY_HEADERS)]
+            key = tuple(row[:3])
+            counts = {col: int(row[3 + i] or 0) for i, col in enumerate(COUNT_COLUMNS)}
+            self._stats[key] = counts | {"Last Seen": row[6]}
+            self._rows[key] = offset + 2
+        self._loaded_at = time.monotonic()
+
+    def _write(self, keys):
+        def as_row(key):
+            stats = self._stats[key]
+            return list(key) + [stats[col] for col in COUNT_COLUMNS] + [stats["Last Seen"]]
+
+        values = self.client.spreadsheets().values()
+        existing = [key for key in keys if key in self._rows]
+        new = [key for key in keys if key not in self._rows]
+        if existing:
+            data = [{"range": f"{self.sheet}!A{self._rows[key]}", "values": [as_row(key)]} for key in existing]
+            self.client.execute(values.batchUpdate(
+                spreadsheetId=self.spreadsheet_id, body={"valueInputOption": "RAW", "data": data}))
+        if new:
+            header = []
+            if not self._has_header:
+                self._ensure_sheet()
+                header = [SUMMARY_HEADERS]
+            result = self.client.execute(values.append(
+                spreadsheetId=self.spreadsheet_id, range=f"{self.sheet}!A1",
+                valueInputOption="RAW", insertDataOption="INSERT_ROWS",
+                body={"values": header + [as_row(key) for key in new]}))
+            self._has_header = True
+            _, last = parse_row_span(result["updates"]["updatedRange"])
+            for offset, key in enumerate(new):
+                self._rows[key] = last - len(new) + 1 + offset
+
+    def _ensure_sheet(self):
+        meta = self.client.execute(self.client.spreadsheets().get(
+            spreadsheetId=self.spreadsheet_id, fields="sheets.properties.title"))
+        titles = [sheet["properties"]["title"] for sheet in meta.get("sheets", [])]
+        if self.sheet not in titles:
+            self.client.execute(self.client.spreadsheets().batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={"requests": [{"addSheet": {"properties": {"title": self.sheet}}}]}))
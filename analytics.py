@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+from aggregates import KEY_COLUMNS
+from instrumentation import span
+from schema import typed_log
+from shared_cache import VersionedCache
+
+# Students below this share of Present days are listed as chronically absent
+CHRONIC_ABSENCE_THRESHOLD = 0.75
+# How long computed analytics are trusted before the log version is checked again (seconds)
+ANALYTICS_TTL = 60
+# Statuses that count towards attendance %; "No Class" days are left out
+MARKED = ["Present", "Absent"]
+
+
+def _rates(grouped):
+    # Present / Absent day counts and attendance % for each group of a marked-days frame
+    table = grouped["present"].agg(Present="sum", Days="size")
+    table["Absent"] = table["Days"] - table["Present"]
+    table["Attendance %"] = (100 * table["Present"] / table["Days"]).round(1)
+    return table[["Present", "Absent", "Attendance %"]]
+
+
+def marked_days(log):
+    """Keep the Present/Absent rows of a typed log frame, with a boolean "present" column."""
+    days = log.loc[log["Status"].isin(MARKED) & log["Date"].notna(), ["Date"] + KEY_COLUMNS + ["Teacher", "Status"]]
+    return days.assign(present=days["Status"] == "Present")
+
+
+def by_column(days, column):
+    """Attendance % per class or per teacher."""
+    return _rates(days.groupby(column, observed=True)).reset_index().sort_values("Attendance %")
+
+
+def monthly_trend(days):
+    """School-wide attendance % per month and the change from the month before."""
+    table = _rates(days.groupby(days["Date"].dt.to_period("M").rename("Month"))).reset_index()
+    table["Change"] = table["Attendance %"].diff().round(1)
+    table["Month"] = table["Month"].astype(str)
+    return table
+
+
+def per_student(days):
+    """Attendance % for every student, keyed like the summary tab."""
+    return _rates(days.groupby(KEY_COLUMNS, observed=True)).reset_index()
+
+
+def absence_streaks(days):
+    """Each student's longest run of consecutive marked days spent absent.
+
+    Days are ordered per student; a run starts wherever the student or the
+    status changes, so runs are found with one cumsum instead of a loop.
+    """
+    student = days.groupby(KEY_COLUMNS, observed=True, sort=False).ngroup().to_numpy()
+    dates = days["Date"].to_numpy()
+    order = np.lexsort((dates, student))
+    student, dates = student[order], dates[order]
+    absent = ~days["present"].to_numpy()[order]
+    new_run = np.r_[True, (student[1:] != student[:-1]) | (absent[1:] != absent[:-1])]
+
+    runs = pd.DataFrame({"run": np.cumsum(new_run)[absent], "student": student[absent],
+                         "row": order[absent], "Date": dates[absent]})
+    streaks = runs.groupby("run").agg(student=("student", "first"), row=("row", "first"),
+                                      Days=("Date", "size"), From=("Date", "min"), To=("Date", "max"))
+    # Longest run per student, ties going to the most recent
+    streaks = streaks.sort_values(["Days", "To"], ascending=False).drop_duplicates(subset="student")
+    keys = days[KEY_COLUMNS].iloc[streaks["row"].to_numpy()].reset_index(drop=True)
+    return keys.assign(Days=streaks["Days"].to_numpy(),
+                       From=streaks["From"].dt.date.to_numpy(), To=streaks["To"].dt.date.to_numpy())
+
+
+def compute(log_chunks):
+    """Every dashboard table from one pass over the log."""
+    with span("analytics read"):
+        chunks = list(log_chunks)
+    with span("analytics compute"):
+        if chunks:
+            log = typed_log(pd.concat(chunks, ignore_index=True))
+        else:
+            log = typed_log(pd.DataFrame(columns=["Date"] + KEY_COLUMNS + ["Teacher", "Status"]))
+        days = marked_days(log)
+        return {
+            "days": len(days),
+            "overall": round(100 * days["present"].mean(), 1) if len(days) else None,
+            "classes": by_column(days, "Class"),
+            "teachers": by_column(days, "Teacher"),
+            "months": monthly_trend(days),
+            "students": per_student(days),
+            "streaks": absence_streaks(days),
+        }
+
+
+class SchoolAnalytics(VersionedCache):
+    """Dashboard tables computed once per log version and shared by every session.
+
+    See VersionedCache: the whole log is only read and recomputed when its
+    version moved or could not be read, and the shared cache, when
+    configured, carries each version's tables between replicas. Returned
+    DataFrames are shared, so callers must treat them as read-only.
+    """
+
+    def __init__(self, log, fetch_version=None, ttl=ANALYTICS_TTL, shared=None):
+        super().__init__("analytics", "log", fetch_version, ttl, shared)
+        self.log = log
+
+    def _build(self):
+        return compute(self.log.iter_chunks())
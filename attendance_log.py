@@ -0,0 +1,298 @@
+import re
+import threading
+
+import pandas as pd
+
+from instrumentation import span
+from schema import typed_log
+
+LOG_SHEET = 'Attendance Log'
+LOG_HEADERS = ["Date", "Student Name", "Class", "Teacher", "Parent 1", "Status"]
+# Rows per window when streaming the log, and rows requested per values().batchGet round trip
+CHUNK_ROWS = 5000
+BATCH_GET_ROWS = 50000
+
+_ROW_RE = re.compile(r'![A-Z]+(\d+)(?::[A-Z]+(\d+))?$')
+
+
+def parse_row_span(a1_range):
+    """Return (first_row, last_row) of an A1 range such as "'Attendance Log'!A5:F9"."""
+    match = _ROW_RE.search(a1_range)
+    if not match:
+        raise ValueError(f"Unexpected range: {a1_range}")
+    first = int(match.group(1))
+    return first, int(match.group(2) or first)
+
+
+class DateRowIndex:
+    """Date -> sheet rows of the Attendance Log.
+
+    Rows are never moved by the incremental writer except when duplicate rows
+    are deleted (see AttendanceLog.write_day), so the index only has to read the Date
+    cells appended since its last sync. Anything else that moves rows (a hand
+    sort, another process deleting rows) is caught when a row read through the
+    index has a different date, and the index is then rebuilt.
+    """
+
+    def __init__(self):
+        self.blocks = {}
+        self.synced_rows = 0
+
+    def reset(self):
+        self.blocks = {}
+        self.synced_rows = 0
+
+    def add(self, day, first_row, last_row):
+        spans = self.blocks.setdefault(day, [])
+        if spans and spans[-1][1] + 1 == first_row:
+            spans[-1] = (spans[-1][0], last_row)
+        else:
+            spans.append((first_row, last_row))
+
+    def extend(self, first_row, dates):
+        # dates: Date column values for rows first_row, first_row + 1, ...
+        for offset, day in enumerate(dates):
+            row = first_row + offset
+            if row > 1 and day:
+                self.add(day, row, row)
+        self.synced_rows = max(self.synced_rows, first_row + len(dates) - 1)
+
+    def rows_for(self, day):
+        return [row for first, last in self.blocks.get(day, []) for row in range(first, last + 1)]
+
+
+def row_key(row):
+    # A student in a log row: (Student Name, Class, Parent 1)
+    return (row[1], row[2], row[4])
+
+
+def frame_from_values(rows, headers):
+    """Build a typed log DataFrame, padding the short rows Sheets returns for trailing blanks."""
+    width = len(headers)
+    rows = [(row + [""] * width)[:width] for row in rows if any(row)]
+    return typed_log(pd.DataFrame(rows, columns=headers))
+
+
+def build_log_rows(day, marks, roster):
+    """Join one submission against the roster and return it as Attendance Log rows.
+
+    ``marks`` has "Student Name", "Class", "Parents Number 1" and "Status"
+    columns. The teacher is looked up with a single merge on all three key
+    columns, so students sharing a name still get their own teacher.
+    """
+    keys = ["Student Name", "Class", "Parents Number 1"]
+    teachers = roster[keys + ["Teacher Name"]].drop_duplicates(subset=keys)
+    batch = marks.merge(teachers, on=keys, how="left", sort=False)
+    batch["Teacher Name"] = batch["Teacher Name"].astype(object).fillna("Unknown")
+    batch.insert(0, "Date", day)
+    return batch[["Date", "Student Name", "Class", "Teacher Name", "Parents Number 1", "Status"]].values.tolist()
+
+
+def read_tabs(client, spreadsheet_id, tabs, chunk_rows=CHUNK_ROWS, batch_rows=BATCH_GET_ROWS):
+    """Stream (tab, DataFrame) chunks of several log tabs in as few round trips as possible.
+
+    ``tabs`` is a list of (tab name, grid row count). Each tab is cut into
+    windows of ``chunk_rows`` rows, and the windows of all tabs go out
+    together in values().batchGet calls of about ``batch_rows`` rows, so a
+    year of month partitions is read in a handful of requests.
+    """
+    windows = [(tab, start, min(start + chunk_rows - 1, total))
+               for tab, total in tabs for start in range(1, total + 1, chunk_rows)]
+    per_call = max(1, batch_rows // chunk_rows)
+    values = client.spreadsheets().values()
+    headers = {}
+    for offset in range(0, len(windows), per_call):
+        batch = windows[offset:offset + per_call]
+        with span("log fetch"):
+            result = client.execute(values.batchGet(
+                spreadsheetId=spreadsheet_id, ranges=[f"{tab}!A{start}:Z{end}" for tab, start, end in batch]))
+        for (tab, start, _), value_range in zip(batch, result.get("valueRanges", [])):
+            rows = value_range.get("values", [])
+            if start == 1:
+                headers[tab] = rows[0] if rows else LOG_HEADERS
+                rows = rows[1:]
+            with span("log parse"):
+                chunk = frame_from_values(rows, headers[tab])
+            if not chunk.empty:
+                yield tab, chunk
+
+
+def _runs(rows):
+    # Group sorted row numbers into contiguous (first, last) runs
+    runs = []
+    for row in rows:
+        if runs and runs[-1][1] + 1 == row:
+            runs[-1] = (runs[-1][0], row)
+        else:
+            runs.append((row, row))
+    return runs
+
+
+class AttendanceLog:
+    """Streaming reader and incremental writer for the Attendance Log tab.
+
+    Students without a row for the date yet are written with one
+    values().append. Re-submitting overwrites only those students' existing
+    rows for that date, found through a DateRowIndex, so a submit costs
+    O(class size) instead of a rewrite of the whole history.
+    """
+
+    def __init__(self, client, spreadsheet_id, sheet=LOG_SHEET):
+        self.client = client
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet = sheet
+        self.index = DateRowIndex()
+        self._sheet_id = None
+        self._lock = threading.Lock()
+
+    def write_day(self, day, rows):
+        """Write ``rows`` as the attendance for ``day`` and return the rows they replaced."""
+        with self._lock:
+            self._sync_index()
+            if self.index.synced_rows == 0:
+                self._values_update(f"{self.sheet}!A1", [LOG_HEADERS])
+                self.index.synced_rows = 1
+
+            # Only this submission's students are replaced; other classes' rows for the day stay
+            submitted = {row_key(row) for row in rows}
+            pending = {row_key(row): row for row in rows}
+            old_rows = self.index.rows_for(day)
+            current = self._read_rows(old_rows)
+            if any(old[0] != day for old in current):
+                # Rows moved under the index (a hand sort, or rows deleted or inserted
+                # elsewhere), so rebuild it from the tab before trusting any row number
+                self.index.reset()
+                self._sync_index()
+                old_rows = self.index.rows_for(day)
+                current = self._read_rows(old_rows)
+            data, stale, replaced = [], [], []
+            for row_number, old in zip(old_rows, current):
+                key = row_key(old)
+                if old[0] != day or key not in submitted:
+                    continue
+                replaced.append(old)
+                if key in pending:
+                    data.append((pending.pop(key), row_number))
+                else:
+                    # A second row for the same student and day
+                    stale.append(row_number)
+
+            if data:
+                values = self.client.spreadsheets().values()
+                self.client.execute(values.batchUpdate(
+                    spreadsheetId=self.spreadsheet_id,
+                    body={"valueInputOption": "RAW", "data": [
+                        {"range": f"{self.sheet}!A{row_number}:F{row_number}", "values": [row]}
+                        for row, row_number in data]}))
+            if pending:
+                self._append(day, list(pending.values()))
+            if stale:
+                self._delete_rows(stale)
+            return replaced
+
+    def append_rows(self, rows, chunk_rows=CHUNK_ROWS, new_tab=False, progress=None):
+        """Append rows of any dates (sorted by date) in chunks of ``chunk_rows``.
+
+        Used by bulk imports, which have already dropped rows that exist. On a
+        tab just created by the caller (``new_tab``) the index sync is skipped.
+        ``progress(n)`` is called with the size of every chunk once it is written.
+        """
+        with self._lock:
+            if not new_tab:
+                self._sync_index()
+            header = [LOG_HEADERS] if self.index.synced_rows == 0 else []
+            values = self.client.spreadsheets().values()
+            for offset in range(0, len(rows), chunk_rows):
+                chunk = rows[offset:offset + chunk_rows]
+                result = self.client.execute(values.append(
+                    spreadsheetId=self.spreadsheet_id, range=f"{self.sheet}!A1",
+                    valueInputOption="RAW", insertDataOption="INSERT_ROWS", body={"values": header + chunk}))
+                first, last = parse_row_span(result["updates"]["updatedRange"])
+                self.index.extend(first, [""] * len(header) + [row[0] for row in chunk])
+                header = []
+                if progress:
+                    progress(len(chunk))
+
+    def dates(self):
+        """Dates present in the tab, from the incrementally synced row index."""
+        with self._lock:
+            self._sync_index()
+            return set(self.index.blocks)
+
+    def row_count(self):
+        # Grid size of the log tab, read from sheet metadata rather than the cells
+        meta = self.client.execute(self.client.spreadsheets().get(
+            spreadsheetId=self.spreadsheet_id, fields="sheets.properties(title,gridProperties.rowCount)"))
+        for sheet in meta.get("sheets", []):
+            if sheet["properties"]["title"] == self.sheet:
+                return sheet["properties"]["gridProperties"]["rowCount"]
+        return 0
+
+    def iter_chunks(self, chunk_rows=CHUNK_ROWS):
+        """Yield the log as DataFrames of at most ``chunk_rows`` rows, oldest first.
+
+        The log is read in fixed row windows up to the real extent of the tab,
+        so callers can aggregate it without holding the whole history.
+        """
+        tabs = [(self.sheet, self.row_count())]
+        for _, chunk in read_tabs(self.client, self.spreadsheet_id, tabs, chunk_rows):
+            yield chunk
+
+    def _sync_index(self):
+        start = self.index.synced_rows + 1
+        values = self.client.spreadsheets().values()
+        result = self.client.execute(values.get(
+            spreadsheetId=self.spreadsheet_id, range=f"{self.sheet}!A{start}:A"))
+        dates = [row[0] if row else "" for row in result.get("values", [])]
+        self.index.extend(start, dates)
+
+    def _read_rows(self, rows):
+        if not rows:
+            return []
+        values = self.client.spreadsheets().values()
+        runs = _runs(rows)
+        result = self.client.execute(values.batchGet(
+            spreadsheetId=self.spreadsheet_id,
+            ranges=[f"{self.sheet}!A{first}:F{last}" for first, last in runs]))
+        # Keep one entry per requested row so callers can zip with the row numbers
+        width = len(LOG_HEADERS)
+        out = []
+        for (first, last), value_range in zip(runs, result.get("valueRanges", [])):
+            got = value_range.get("values", [])
+            got = got + [[]] * (last - first + 1 - len(got))
+            out.extend((row + [""] * width)[:width] for row in got)
+        return out
+
+    def _append(self, day, rows):
+        values = self.client.spreadsheets().values()
+        result = self.client.execute(values.append(
+            spreadsheetId=self.spreadsheet_id, range=f"{self.sheet}!A1",
+            valueInputOption="RAW", insertDataOption="INSERT_ROWS", body={"values": rows}))
+        first, last = parse_row_span(result["updates"]["updatedRange"])
+        self.index.add(day, first, last)
+        self.index.synced_rows = max(self.index.synced_rows, last)
+
+    def _delete_rows(self, rows):
+        # Deleting shifts every row below, so the index is rebuilt on the next write
+        sheet_id = self._get_sheet_id()
+        requests = [{"deleteDimension": {"range": {
+            "sheetId": sheet_id, "dimension": "ROWS", "startIndex": first - 1, "endIndex": last}}}
+            for first, last in reversed(_runs(rows))]
+        self.client.execute(self.client.spreadsheets().batchUpdate(
+            spreadsheetId=self.spreadsheet_id, body={"requests": requests}))
+        self.index.reset()
+
+    def _values_update(self, a1_range, rows):
+        values = self.client.spreadsheets().values()
+        self.client.execute(values.update(
+            spreadsheetId=self.spreadsheet_id, range=a1_range,
+            valueInputOption="RAW", body={"values": rows}))
+
+    def _get_sheet_id(self):
+        if self._sheet_id is None:
+            meta = self.client.execute(self.client.spreadsheets().get(
+                spreadsheetId=self.spreadsheet_id, fields="sheets.properties(sheetId,title)"))
+            for sheet in meta.get("sheets", []):
+                if sheet["properties"]["title"] == self.sheet:
+                    self._sheet_id = sheet["properties"]["sheetId"]
+        return self._sheet_id
@@ -0,0 +1,214 @@
+"""In-memory stand-in for the parts of the Sheets/Drive API the app uses.
+
+FakeSheetsClient has the same surface as sheets_client.SheetsClient
+(spreadsheets(), files(), execute(), the rerun hooks and run_parallel()), so
+the storage classes and the app itself run against it unchanged. Every execute() sleeps for the configured latency and is counted.
+"""
+import json
+import re
+import threading
+import time
+from collections import Counter
+
+_CELL_RE = re.compile(r'^([A-Z]+)?(\d+)?$')
+
+
+def _split_range(a1_range):
+    tab, _, cells = a1_range.partition('!')
+    tab = tab.strip("'")
+    if not cells:
+        return tab, 1, None
+    first, _, last = cells.partition(':')
+    first_row = int(_CELL_RE.match(first).group(2) or 1)
+    if not last:
+        # "A5" addresses a single row for reads; writes start there
+        return tab, first_row, first_row if _CELL_RE.match(first).group(2) else None
+    last_row = _CELL_RE.match(last).group(2)
+    return tab, first_row, int(last_row) if last_row else None
+
+
+def _http_error(status, message):
+    from googleapiclient.errors import HttpError
+    from httplib2 import Response
+    content = json.dumps({"error": {"code": status, "message": message}}).encode()
+    return HttpError(Response({"status": status}), content)
+
+
+class _Request:
+    def __init__(self, client, method, fn):
+        self.client = client
+        self.method = method
+        self.fn = fn
+
+    def execute(self, **kwargs):
+        return self.client.execute(self)
+
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self.tabs = {}
+        self.version = 1
+
+    def rows(self, tab):
+        return self.tabs.setdefault(tab, [])
+
+
+class FakeSheetsClient:
+    """Counts calls per method and the JSON size of every response."""
+
+    def __init__(self, latency=0.0, count_bytes=True):
+        self.latency = latency
+        self.count_bytes = count_bytes
+        self.spreadsheets_by_id = {}
+        self.calls = Counter()
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def spreadsheet(self, spreadsheet_id):
+        return self.spreadsheets_by_id.setdefault(spreadsheet_id, FakeSpreadsheet())
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.bytes = 0
+
+    # --- SheetsClient surface ---
+    def spreadsheets(self):
+        return _Spreadsheets(self)
+
+    def files(self):
+        return _Files(self)
+
+    def execute(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            result = request.fn()
+            self.calls[request.method] += 1
+            if self.count_bytes:
+                self.bytes += len(json.dumps(result))
+        return result
+
+    def begin_rerun(self):
+        pass
+
+    def end_rerun(self):
+        pass
+
+    def run_parallel(self, jobs):
+        return [job() for job in jobs]
+
+
+class _Spreadsheets:
+    def __init__(self, client):
+        self.client = client
+
+    def values(self):
+        return _Values(self.client)
+
+    def get(self, spreadsheetId, fields=None, **kwargs):
+        def fn():
+            book = self.client.spreadsheet(spreadsheetId)
+            return {"sheets": [
+                {"properties": {"sheetId": index, "title": title,
+                                "gridProperties": {"rowCount": max(len(rows), 1)}}}
+                for index, (title, rows) in enumerate(book.tabs.items())]}
+        return _Request(self.client, "spreadsheets.get", fn)
+
+    def batchUpdate(self, spreadsheetId, body, **kwargs):
+        def fn():
+            book = self.client.spreadsheet(spreadsheetId)
+            titles = list(book.tabs)
+            added = [request["addSheet"]["properties"]["title"] for request in body.get("requests", [])
+                     if "addSheet" in request]
+            for title in added:
+                if title in book.tabs:
+                    # Like Sheets: the whole batch is rejected and nothing is applied
+                    raise _http_error(400, f'Invalid requests[0].addSheet: A sheet with the name "{title}" '
+                                           'already exists. Please enter another name.')
+            for request in body.get("requests", []):
+                if "addSheet" in request:
+                    book.rows(request["addSheet"]["properties"]["title"])
+                elif "deleteDimension" in request:
+                    span = request["deleteDimension"]["range"]
+                    del book.tabs[titles[span["sheetId"]]][span["startIndex"]:span["endIndex"]]
+            book.version += 1
+            return {}
+        return _Request(self.client, "spreadsheets.batchUpdate", fn)
+
+
+class _Values:
+    def __init__(self, client):
+        self.client = client
+
+    def _read(self, spreadsheet_id, a1_range):
+        tab, first, last = _split_range(a1_range)
+        rows = self.client.spreadsheet(spreadsheet_id).rows(tab)[first - 1:last]
+        while rows and not rows[-1]:
+            rows = rows[:-1]
+        result = {"range": a1_range}
+        if rows:
+            result["values"] = [list(row) for row in rows]
+        return result
+
+    def _write(self, spreadsheet_id, a1_range, values):
+        tab, first, _ = _split_range(a1_range)
+        book = self.client.spreadsheet(spreadsheet_id)
+        rows = book.rows(tab)
+        if len(rows) < first - 1 + len(values):
+            rows.extend([] for _ in range(first - 1 + len(values) - len(rows)))
+        for offset, row in enumerate(values):
+            rows[first - 1 + offset] = list(row)
+        book.version += 1
+
+    def get(self, spreadsheetId, range, **kwargs):
+        return _Request(self.client, "values.get", lambda: self._read(spreadsheetId, range))
+
+    def batchGet(self, spreadsheetId, ranges, **kwargs):
+        return _Request(self.client, "values.batchGet", lambda: {
+            "valueRanges": [self._read(spreadsheetId, a1_range) for a1_range in ranges]})
+
+    def update(self, spreadsheetId, range, body, **kwargs):
+        def fn():
+            self._write(spreadsheetId, range, body["values"])
+            return {"updatedRows": len(body["values"])}
+        return _Request(self.client, "values.update", fn)
+
+    def batchUpdate(self, spreadsheetId, body, **kwargs):
+        def fn():
+            for data in body["data"]:
+                self._write(spreadsheetId, data["range"], data["values"])
+            return {"totalUpdatedRows": sum(len(data["values"]) for data in body["data"])}
+        return _Request(self.client, "values.batchUpdate", fn)
+
+    def append(self, spreadsheetId, range, body, **kwargs):
+        def fn():
+            tab, _, _ = _split_range(range)
+            book = self.client.spreadsheet(spreadsheetId)
+            rows = book.rows(tab)
+            while rows and not rows[-1]:
+                rows.pop()
+            first = len(rows) + 1
+            rows.extend(list(row) for row in body["values"])
+            book.version += 1
+            return {"updates": {"updatedRange": f"'{tab}'!A{first}:F{len(rows)}",
+                                "updatedRows": len(body["values"])}}
+        return _Request(self.client, "values.append", fn)
+
+    def _clear(self, spreadsheet_id, a1_range):
+        tab, first, last = _split_range(a1_range)
+        rows = self.client.spreadsheet(spreadsheet_id).rows(tab)
+        for index in range(first - 1, min(last or len(rows), len(rows))):
+            rows[index] = []
+        return {}
+
+    def clear(self, spreadsheetId, range, **kwargs):
+        return _Request(self.client, "values.clear", lambda: self._clear(spreadsheetId, range))
+
+
+class _Files:
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, fileId, fields=None, **kwargs):
+        return _Request(self.client, "files.get",
+                        lambda: {"version": str(self.client.spreadsheet(fileId).version)})
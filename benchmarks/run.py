@@ -0,0 +1,156 @@
+"""Benchmark the app's hot paths against a fake Sheets API.
+
+    python -m benchmarks.run --students 100,2000,20000 --log-rows 200000 --latency 0.05 --json bench.json
+
+For each synthetic school it reports median wall time, Sheets API calls and
+bytes per operation, and the peak Python memory of one run.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from analytics import SchoolAnalytics
+from attendance_log import LOG_HEADERS, build_log_rows
+from benchmarks.fake_sheets import FakeSheetsClient
+from benchmarks.synthetic import CLASS_SIZE, make_log, make_roster, split_by_month
+from history import HistoryIndex, StudentHistory
+from partitions import partition_name
+from roster import ROSTER_RANGE, RosterCache, clean_roster, student_keys
+from storage import SheetsStorage
+
+ROSTER_ID = "roster"
+LOG_ID = "log"
+
+
+def build_school(students, log_rows, latency):
+    client = FakeSheetsClient()
+    roster = make_roster(students)
+    client.spreadsheet(ROSTER_ID).tabs[ROSTER_RANGE] = roster
+    for month, rows in split_by_month(make_log(roster, log_rows)).items():
+        client.spreadsheet(LOG_ID).tabs[partition_name(month)] = [list(LOG_HEADERS)] + rows
+    storage = SheetsStorage(client, ROSTER_ID, LOG_ID)
+    storage.aggregates.rebuild()
+    client.latency = latency
+    return client, storage, roster
+
+
+def measure(client, fn, repeat):
+    """Run ``fn`` ``repeat`` times; return median ms, calls and bytes per run, and peak MB."""
+    times = []
+    client.reset_counters()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    calls = sum(client.calls.values()) / repeat
+    sent = client.bytes / repeat
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ms": statistics.median(times), "calls": calls, "bytes": sent, "peak_mb": peak / 2 ** 20}
+
+
+def session_footprint(cache, phones):
+    """Bytes a parent session retains: the student keys it stores, and the DataFrame copy it used to keep."""
+    matches = [cache.lookup_phone(phone) for phone in phones]
+    records = [record for match in matches if match and match[0] == "Parent" for _, record in [match]]
+
+    def retained(build):
+        tracemalloc.start()
+        sessions = [build(record) for record in records]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del sessions
+        return size / max(1, len(records))
+
+    return {
+        "keys": retained(lambda record: tuple(student_keys(record))),
+        "DataFrame copy": retained(lambda record: record.copy()),
+    }
+
+
+def bench_school(students, log_rows, latency, repeat):
+    client, storage, roster = build_school(students, log_rows, latency)
+    rng = random.Random(1)
+    results = {}
+
+    results["load_data (cold)"] = measure(
+        client, lambda: RosterCache(storage.roster_values, storage.roster_version, ttl=0).get(), repeat)
+
+    cache = RosterCache(storage.roster_values, storage.roster_version, ttl=0)
+    cache.get()
+    results["load_data (unchanged sheet)"] = measure(client, cache.get, repeat)
+
+    # Warm cache, as in a running server
+    cache.ttl = 3600
+    phones = [row[4].replace(".0", "") for row in rng.sample(roster[1:], min(1000, students))]
+    results[f"login lookup x{len(phones)}"] = measure(
+        client, lambda: [cache.lookup_phone(phone) for phone in phones], repeat)
+    session = session_footprint(cache, phones)
+
+    student = clean_roster(roster).iloc[students // 2]
+    key = (student["Student Name"], student["Class"], student["Parents Number 1"])
+    results["summary counts"] = measure(client, lambda: storage.aggregates.get(*key), repeat)
+
+    def cold(fn):
+        # The rebuild in build_school froze the closed months in memory; a new log version starts without them
+        def run():
+            storage.log._frozen.clear()
+            return fn()
+        return run
+
+    results["history index build"] = measure(
+        client, cold(lambda: HistoryIndex.build(storage.log.iter_chunks())), repeat)
+    history = StudentHistory(storage.log, ttl=3600)
+    history.get()
+    results["summary history page"] = measure(client, lambda: history.get().page(key, "2024-01-01"), repeat)
+    results["school analytics (new version)"] = measure(client, cold(lambda: SchoolAnalytics(storage.log).get()), repeat)
+
+    students_df = cache.get()
+    class_df = students_df[students_df["Class"] == student["Class"]][["Student Name", "Class", "Parents Number 1"]]
+    days = iter(f"2030-01-{day:02d}" for day in range(1, 32))
+
+    def submit(day, status):
+        marks = class_df.assign(Status=status)
+        rows = build_log_rows(day, marks, students_df)
+        replaced = storage.log.write_day(day, rows)
+        storage.aggregates.apply(rows, replaced)
+
+    results["submit new date"] = measure(client, lambda: submit(next(days), "Present"), min(repeat, 10))
+    results["submit re-submission"] = measure(client, lambda: submit("2030-01-01", "Absent"), repeat)
+    return results, session
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", default="100,2000", help="comma-separated roster sizes")
+    parser.add_argument("--log-rows", type=int, default=50000, help="attendance history length")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API call")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    report = {"log_rows": args.log_rows, "latency": args.latency, "class_size": CLASS_SIZE, "schools": {}}
+    for students in [int(n) for n in args.students.split(",")]:
+        results, session = bench_school(students, args.log_rows, args.latency, args.repeat)
+        report["schools"][students] = dict(results, **{"parent session bytes": session})
+        print(f"\n{students} students, {args.log_rows} log rows, {args.latency * 1000:.0f} ms latency")
+        print(f"{'benchmark':<30}{'ms':>10}{'calls':>8}{'KB':>10}{'peak MB':>10}")
+        for name, r in results.items():
+            print(f"{name:<30}{r['ms']:>10.2f}{r['calls']:>8.1f}{r['bytes'] / 1024:>10.1f}{r['peak_mb']:>10.2f}")
+        print(f"parent session state: {session['keys']:.0f} bytes of student keys "
+              f"(was {session['DataFrame copy']:.0f} bytes as a DataFrame copy)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Benchmark the app's cold start: import time, time to first paint and the first login.
+
+    python -m benchmarks.startup --students 2000 --latency 0.2 --json startup.json
+
+Every measurement runs in a fresh interpreter so nothing is imported yet.
+The app itself runs under Streamlit's AppTest against the in-memory fake of
+the Sheets API, with ``latency`` seconds added to every call.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# What the login form needs, and what the script used to import before showing it
+LOGIN_IMPORTS = ["streamlit", "instrumentation"]
+APP_IMPORTS = LOGIN_IMPORTS + ["pandas", "googleapiclient.discovery", "roster", "sheets_client", "attendance_log",
+                               "storage", "shared_cache", "write_queue", "analytics", "importer", "reports",
+                               "history", "scheduler", "notifications"]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# SPREADSHEET_ID in student_app.py, where the app reads the roster from
+ROSTER_ID = '1dwju2Um-3RXlaOKwRS7jaNEmIXBGMIbMxIOv4t5Lpnw'
+
+
+def import_time(modules):
+    # Runs in the child interpreter
+    import time
+    started = time.perf_counter()
+    for module in modules:
+        __import__(module)
+    return {"ms": (time.perf_counter() - started) * 1000}
+
+
+def cold_start(students, latency):
+    """Runs in the child: first paint for an anonymous visitor, the background warm-up, then a teacher login."""
+    import threading
+    import time
+    import types
+
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_ms = (time.perf_counter() - started) * 1000
+
+    from benchmarks.fake_sheets import FakeSheetsClient
+    from benchmarks.synthetic import make_roster
+    client = FakeSheetsClient(latency=latency)
+    roster = make_roster(students)
+    client.spreadsheet(ROSTER_ID).tabs["S1 - Student Details"] = roster
+    # The app builds its client lazily through sheets_client.SheetsClient; hand it the fake instead
+    sys.modules["sheets_client"] = types.SimpleNamespace(SheetsClient=lambda *args, **kwargs: client)
+
+    at = AppTest.from_file(os.path.join(ROOT, "student_app.py"), default_timeout=120)
+    at.secrets["gcp_service_account"] = {"type": "service_account"}
+    started = time.perf_counter()
+    at.run()
+    first_paint_ms = (time.perf_counter() - started) * 1000
+    login_form = len(at.sidebar.text_input) > 0
+    calls_at_paint = sum(client.calls.values())
+
+    for thread in threading.enumerate():
+        if thread.name == "attendance-warm-up":
+            thread.join()
+    warm_up_ms = (time.perf_counter() - started) * 1000
+
+    at.sidebar.text_input[0].input(roster[1][3].replace(".0", ""))
+    started = time.perf_counter()
+    at.sidebar.button[0].click().run()
+    login_ms = (time.perf_counter() - started) * 1000
+    return {"streamlit import ms": streamlit_ms, "first paint ms": first_paint_ms, "login form shown": login_form,
+            "API calls before first paint": calls_at_paint, "warm-up done after ms": warm_up_ms,
+            "login to first page ms": login_ms, "logged in": bool(at.session_state.logged_in)}
+
+
+def in_child(function, *args):
+    code = (f"import json, sys; from benchmarks.startup import {function}; "
+            f"print(json.dumps({function}(*json.loads(sys.argv[1]))))")
+    with tempfile.TemporaryDirectory() as directory:
+        # AppTest's own secrets only reach the script thread; the warm-up thread reads
+        # .streamlit/secrets.toml from the working directory, as on a server
+        os.mkdir(os.path.join(directory, ".streamlit"))
+        with open(os.path.join(directory, ".streamlit", "secrets.toml"), "w") as f:
+            f.write('[gcp_service_account]\ntype = "service_account"\n')
+        output = subprocess.run([sys.executable, "-c", code, json.dumps(args)], cwd=directory, check=True,
+                                capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=ROOT)).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=2000, help="roster size")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds added to every API call")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    report = {
+        "students": args.students, "latency": args.latency,
+        "import ms (login form)": in_child("import_time", LOGIN_IMPORTS)["ms"],
+        "import ms (all app modules)": in_child("import_time", APP_IMPORTS)["ms"],
+    }
+    report.update(in_child("cold_start", args.students, args.latency))
+
+    print(f"\n{args.students} students, {args.latency * 1000:.0f} ms latency")
+    for name, value in report.items():
+        if name not in ("students", "latency"):
+            print(f"{name:<32}{value:>10.1f}" if isinstance(value, float) else f"{name:<32}{value!s:>10}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Synthetic schools: rosters and attendance histories of any size."""
+import random
+from datetime import date, timedelta
+
+ROSTER_HEADERS = ["Student Name", "Class", "Teacher Name", "Teacher Phone Number",
+                  "Parents Number 1", "Parents Number 2", "Password"]
+CLASS_SIZE = 30
+STATUSES = ["Present"] * 17 + ["Absent"] * 2 + ["No Class"]
+
+
+def make_roster(students, seed=0):
+    """Roster values (header first) for ``students`` students in classes of CLASS_SIZE.
+
+    Half the parent numbers come back as "9000000000.0", like numbers typed
+    into the real sheet, so the ".0" cleanup in the roster loader is exercised.
+    """
+    rng = random.Random(seed)
+    rows = [ROSTER_HEADERS]
+    for i in range(students):
+        class_no = i // CLASS_SIZE
+        parent1 = 9000000000 + 2 * i
+        rows.append([
+            f"Student {i}",
+            f"{class_no // 4 + 1}{'ABCD'[class_no % 4]}",
+            f"Teacher {class_no}",
+            f"{8000000000 + class_no}.0",
+            f"{parent1}.0" if rng.random() < 0.5 else str(parent1),
+            str(parent1 + 1) if rng.random() < 0.7 else "",
+            f"pw{i}",
+        ])
+    return rows
+
+
+def school_days(start, count):
+    day = start
+    while count:
+        if day.weekday() < 5:
+            yield day
+            count -= 1
+        day += timedelta(days=1)
+
+
+def make_log(roster, rows, start=date(2024, 1, 1), seed=0):
+    """Attendance rows (no header), one block per school day, about ``rows`` long."""
+    rng = random.Random(seed)
+    students = roster[1:]
+    days = max(1, -(-rows // max(1, len(students))))
+    log = []
+    for day in school_days(start, days):
+        stamp = day.strftime("%Y-%m-%d")
+        for student in students:
+            log.append([stamp, student[0], student[1], student[2],
+                        student[4].replace(".0", ""), rng.choice(STATUSES)])
+            if len(log) == rows:
+                return log
+    return log
+
+
+def split_by_month(log):
+    """Group log rows into {"YYYY-MM": rows} the way PartitionedAttendanceLog stores them."""
+    months = {}
+    for row in log:
+        months.setdefault(row[0][:7], []).append(row)
+    return months
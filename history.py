@@ -0,0 +1,102 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from aggregates import KEY_COLUMNS
+from instrumentation import span
+from schema import typed_log
+from shared_cache import VersionedCache
+
+# How long the index is trusted before the log version is checked again (seconds)
+HISTORY_TTL = 60
+# Rows of the daily history table sent per page
+HISTORY_PAGE_SIZE = 50
+# Months in which a school term starts; the current term runs from the latest one
+TERM_START_MONTHS = [1, 5, 9]
+
+
+def period_start(period, today=None):
+    """First day of a named period ("Last 30 days", "This term", "This year", "All") or None."""
+    today = today or date.today()
+    if period == "Last 30 days":
+        return today - timedelta(days=29)
+    if period == "This term":
+        started = [month for month in TERM_START_MONTHS if month <= today.month]
+        if started:
+            return date(today.year, max(started), 1)
+        return date(today.year - 1, max(TERM_START_MONTHS), 1)
+    if period == "This year":
+        return date(today.year, 1, 1)
+    return None
+
+
+class HistoryIndex:
+    """Every student's marked days, sorted by student and then parsed date.
+
+    Each student owns one contiguous slice of the date array, so a date
+    range is two binary searches within that slice and a page of history is
+    a slice of it; nothing is scanned or re-sorted per request.
+    """
+
+    def __init__(self, log):
+        log = log[(log["Status"] != "No Class") & log["Date"].notna()]
+        student = log.groupby(KEY_COLUMNS, observed=True, sort=False).ngroup().to_numpy()
+        days = log["Date"].to_numpy().astype("datetime64[D]")
+        order = np.lexsort((days, student))
+        self.dates = days[order]
+        # Status is categorical (see schema.typed_log); keep its codes, not a string per day
+        self.categories = np.asarray(log["Status"].cat.categories.astype(str))
+        self.codes = log["Status"].cat.codes.to_numpy()[order]
+
+        student = student[order]
+        bounds = np.flatnonzero(np.r_[True, student[1:] != student[:-1], True]) if len(student) else np.array([0])
+        firsts = order[bounds[:-1]]
+        keys = zip(*(log[col].iloc[firsts].astype(str).tolist() for col in KEY_COLUMNS))
+        self.slices = {key: (start, stop) for key, start, stop in zip(keys, bounds[:-1], bounds[1:])}
+
+    @classmethod
+    def build(cls, log_chunks):
+        chunks = list(log_chunks)
+        if chunks:
+            log = typed_log(pd.concat(chunks, ignore_index=True))
+        else:
+            log = typed_log(pd.DataFrame(columns=["Date"] + KEY_COLUMNS + ["Status"]))
+        return cls(log)
+
+    def _range(self, key, start=None, end=None):
+        first, last = self.slices.get(tuple(key), (0, 0))
+        dates = self.dates[first:last]
+        lo = first + (np.searchsorted(dates, np.datetime64(start, "D"), "left") if start else 0)
+        hi = first + (np.searchsorted(dates, np.datetime64(end, "D"), "right") if end else len(dates))
+        return lo, hi
+
+    def count(self, key, start=None, end=None):
+        lo, hi = self._range(key, start, end)
+        return int(hi - lo)
+
+    def page(self, key, start=None, end=None, page=1, page_size=HISTORY_PAGE_SIZE):
+        """Return (total days in range, DataFrame of Date/Status for one page, newest first)."""
+        lo, hi = self._range(key, start, end)
+        stop = max(lo, hi - (page - 1) * page_size)
+        first = max(lo, stop - page_size)
+        rows = pd.DataFrame({"Date": self.dates[first:stop][::-1],
+                             "Status": self.categories[self.codes[first:stop][::-1]]})
+        return int(hi - lo), rows
+
+
+class StudentHistory(VersionedCache):
+    """HistoryIndex built once per log version and shared by every session.
+
+    See VersionedCache: the log is only re-read when its version moved, a
+    submit on any replica moves the shared "log" generation, and with a
+    shared cache the index of each version is built by one replica only.
+    """
+
+    def __init__(self, log, fetch_version=None, ttl=HISTORY_TTL, shared=None):
+        super().__init__("history", "log", fetch_version, ttl, shared)
+        self.log = log
+
+    def _build(self):
+        with span("history index build"):
+            return HistoryIndex.build(self.log.iter_chunks())
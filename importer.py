@@ -0,0 +1,126 @@
+import pandas as pd
+
+from attendance_log import LOG_HEADERS
+from roster import normalize_phone
+from schema import DATE_FORMAT
+
+# Rows sent per append when importing; about 2 MB of JSON per request
+IMPORT_CHUNK_ROWS = 20000
+STATUSES = ["Present", "Absent", "No Class"]
+REQUIRED_COLUMNS = ["Date", "Student Name", "Class", "Status"]
+KEY = ["Date", "Student Name", "Class", "Parent 1"]
+
+
+def read_upload(data, filename):
+    """Read an uploaded CSV or Excel file into a DataFrame of strings."""
+    if filename.lower().endswith((".xlsx", ".xls")):
+        try:
+            return pd.read_excel(data, dtype=str, keep_default_na=False)
+        except ImportError:
+            raise ValueError("Excel files need the openpyxl package; upload a CSV instead.")
+    return pd.read_csv(data, dtype=str, keep_default_na=False)
+
+
+def _reject(rejected, frame, reason):
+    if not frame.empty:
+        rejected.append(frame.assign(Reason=reason))
+
+
+def validate(upload, roster):
+    """Check an upload against the roster and return (rows, rejected).
+
+    ``upload`` uses the Attendance Log headers; Teacher and Parent 1 may be
+    left out. Students are matched to the roster with one keyed merge on
+    name and class (and Parent 1 when given), which also fills in their
+    teacher and parent number. ``rows`` is a DataFrame with exactly
+    LOG_HEADERS, one row per (Date, student); ``rejected`` holds the dropped
+    rows with a Reason column.
+    """
+    missing = [col for col in REQUIRED_COLUMNS if col not in upload.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    df = upload.copy()
+    df["Line"] = range(2, len(df) + 2)
+    for col in ["Student Name", "Class", "Status"]:
+        df[col] = df[col].astype(str).str.strip()
+    df["Status"] = df["Status"].str.title()
+    dates = df["Date"].astype(str).str.strip()
+    # ISO first, as the log itself writes them; day-first only for what is left, since
+    # dayfirst=True would read 2026-10-05 as the 10th of May
+    parsed = pd.to_datetime(dates, errors="coerce", format=DATE_FORMAT)
+    other = parsed.isna()
+    parsed[other] = pd.to_datetime(dates[other], errors="coerce", format="mixed", dayfirst=True)
+    df["Date"] = parsed.dt.strftime(DATE_FORMAT)
+
+    rejected = []
+    bad = parsed.isna()
+    _reject(rejected, df[bad], "Unreadable date")
+    df = df[~bad]
+    bad = ~df["Status"].isin(STATUSES)
+    _reject(rejected, df[bad], "Status must be Present, Absent or No Class")
+    df = df[~bad]
+
+    # Keyed join with the roster; Parent 1 narrows the match when the file has it
+    students = pd.DataFrame({
+        "Student Name": roster["Student Name"].astype(str).str.strip(),
+        "Class": roster["Class"].astype(str).str.strip(),
+        "Roster Parent": roster["Parents Number 1"].astype(str),
+        "Roster Teacher": roster["Teacher Name"].astype(str),
+    })
+    keys = ["Student Name", "Class"]
+    if "Parent 1" in df.columns:
+        df["Parent 1"] = df["Parent 1"].map(normalize_phone)
+        given = df["Parent 1"] != ""
+    else:
+        given = pd.Series(False, index=df.index)
+    matches = df.reset_index().merge(students, on=keys, how="left")
+    matches = matches[matches["Roster Parent"].isna() | ~given.loc[matches["index"]].values
+                      | (matches["Roster Parent"] == matches.get("Parent 1"))]
+    counts = matches.dropna(subset=["Roster Parent"]).groupby("index").size()
+
+    unknown = ~df.index.isin(counts.index)
+    _reject(rejected, df[unknown], "Not in the roster")
+    ambiguous = df.index.isin(counts.index[counts > 1])
+    _reject(rejected, df[ambiguous], "Several roster students match; add Parent 1")
+    matches = matches[matches["index"].isin(counts.index[counts == 1])].dropna(subset=["Roster Parent"])
+
+    rows = pd.DataFrame({
+        "Date": matches["Date"], "Student Name": matches["Student Name"], "Class": matches["Class"],
+        "Teacher": matches["Roster Teacher"], "Parent 1": matches["Roster Parent"],
+        "Status": matches["Status"], "Line": matches["Line"],
+    })
+    # The last line wins when the file lists a student twice for one date
+    duplicated = rows.duplicated(subset=KEY, keep="last")
+    _reject(rejected, rows[duplicated], "Repeated later in the file")
+    rows = rows[~duplicated].sort_values(["Date", "Line"])
+
+    rejected = pd.concat(rejected, ignore_index=True).sort_values("Line") if rejected else pd.DataFrame()
+    return rows[LOG_HEADERS].reset_index(drop=True), rejected
+
+
+def drop_existing(rows, log):
+    """Split ``rows`` into (new, already recorded) against the log's (Date, student) entries.
+
+    Only the log's date range covered by the import is read.
+    """
+    if rows.empty:
+        return rows, rows
+    existing = []
+    for chunk in log.iter_chunks(start=rows["Date"].min(), end=rows["Date"].max()):
+        existing.append(pd.DataFrame({
+            "Date": chunk["Date"].dt.strftime(DATE_FORMAT), "Student Name": chunk["Student Name"].astype(str),
+            "Class": chunk["Class"].astype(str), "Parent 1": chunk["Parent 1"].astype(str)}))
+    if not existing:
+        return rows, rows.iloc[0:0]
+    seen = pd.concat(existing, ignore_index=True).drop_duplicates()
+    flagged = rows.merge(seen, on=KEY, how="left", indicator=True)["_merge"].eq("both").values
+    return rows[~flagged], rows[flagged]
+
+
+def import_rows(storage, rows, progress=None, chunk_rows=IMPORT_CHUNK_ROWS):
+    """Append validated, de-duplicated rows to the log and fold them into the summary counts."""
+    values = rows[LOG_HEADERS].values.tolist()
+    storage.log.import_rows(values, chunk_rows=chunk_rows, progress=progress)
+    storage.aggregates.apply(values)
+    return len(values)
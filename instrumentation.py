@@ -0,0 +1,159 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+logger = logging.getLogger("attendance.perf")
+
+# Samples kept per (mode, stage) for percentiles, and reruns kept for export
+SAMPLES_PER_STAGE = 1000
+RERUN_HISTORY = 5000
+# Default Sheets API per-minute read quota for a project
+SHEETS_QUOTA_PER_MINUTE = 300
+RENDER_STAGE = "render & other"
+
+
+class RerunStats:
+    """Spans and API traffic of one script run of one session."""
+
+    def __init__(self, mode=None):
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.finished = False
+        self.spans = []
+        self.api_calls = 0
+        self.bytes = 0
+        self.depth = 0
+
+
+class Metrics:
+    """Process-wide latency and API usage numbers for the admin panel.
+
+    Spans are attached to the rerun running on the current thread (each
+    Streamlit session runs its script on its own thread) and folded into the
+    per-stage samples once the rerun finishes, when its mode is known. Work
+    outside a rerun, such as the background writer, is filed under
+    "background".
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=SAMPLES_PER_STAGE))
+        self._reruns = deque(maxlen=RERUN_HISTORY)
+        self._call_times = deque()
+
+    # --- recording ---
+    def start_rerun(self, previous=None):
+        # A rerun that ended in st.rerun() never reached finish_rerun(); close it now
+        if previous is not None:
+            self.finish_rerun(previous)
+        rerun = RerunStats()
+        self._local.rerun = rerun
+        return rerun
+
+    def set_mode(self, mode):
+        rerun = getattr(self._local, "rerun", None)
+        if rerun is not None:
+            rerun.mode = mode
+
+    def finish_rerun(self, rerun=None):
+        rerun = rerun or getattr(self._local, "rerun", None)
+        if rerun is None or rerun.finished:
+            return
+        rerun.finished = True
+        total = (time.perf_counter() - rerun.started) * 1000
+        mode = rerun.mode or "login"
+        top_level = sum(ms for _, ms, depth in rerun.spans if depth == 0)
+        stages = defaultdict(float)
+        for stage, ms, _ in rerun.spans:
+            stages[stage] += ms
+        record = {
+            "ts": time.time(), "mode": mode, "total_ms": round(total, 2),
+            "api_calls": rerun.api_calls, "bytes": rerun.bytes,
+            "stages": {stage: round(ms, 2) for stage, ms in stages.items()},
+        }
+        with self._lock:
+            for stage, ms, _ in rerun.spans:
+                self._samples[(mode, stage)].append(ms)
+            self._samples[(mode, RENDER_STAGE)].append(max(total - top_level, 0.0))
+            self._samples[(mode, "rerun total")].append(total)
+            self._reruns.append(record)
+        logger.info(json.dumps(record))
+
+    @contextmanager
+    def span(self, stage):
+        rerun = getattr(self._local, "rerun", None)
+        if rerun is not None and rerun.finished:
+            rerun = None
+        depth = rerun.depth if rerun is not None else 0
+        if rerun is not None:
+            rerun.depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            if rerun is not None:
+                rerun.depth -= 1
+                rerun.spans.append((stage, ms, depth))
+            else:
+                with self._lock:
+                    self._samples[("background", stage)].append(ms)
+
+    def bind(self, fn):
+        # Wrap fn so that, on a worker thread, its spans and API calls count towards the caller's rerun
+        rerun = getattr(self._local, "rerun", None)
+
+        def bound(*args, **kwargs):
+            self._local.rerun = rerun
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._local.rerun = None
+        return bound
+
+    def record_api_call(self, nbytes):
+        now = time.time()
+        with self._lock:
+            self._call_times.append(now)
+            while self._call_times and self._call_times[0] < now - 60:
+                self._call_times.popleft()
+        rerun = getattr(self._local, "rerun", None)
+        if rerun is not None and not rerun.finished:
+            rerun.api_calls += 1
+            rerun.bytes += nbytes
+
+    # --- reporting ---
+    def stage_table(self):
+        rows = []
+        with self._lock:
+            items = [(key, sorted(samples)) for key, samples in self._samples.items() if samples]
+        for (mode, stage), samples in sorted(items):
+            rows.append({
+                "Mode": mode, "Stage": stage, "Samples": len(samples),
+                "p50 ms": round(_percentile(samples, 50), 2), "p95 ms": round(_percentile(samples, 95), 2),
+            })
+        return rows
+
+    def calls_last_minute(self):
+        now = time.time()
+        with self._lock:
+            return sum(1 for t in self._call_times if t >= now - 60)
+
+    def export_jsonl(self):
+        with self._lock:
+            return "\n".join(json.dumps(record) for record in self._reruns)
+
+
+def _percentile(sorted_samples, pct):
+    index = min(len(sorted_samples) - 1, max(0, round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+# One registry per server process
+METRICS = Metrics()
+span = METRICS.span
+record_api_call = METRICS.record_api_call
@@ -0,0 +1,216 @@
+import itertools
+import json
+import queue
+import random
+import threading
+import time
+import urllib.request
+from collections import Counter, OrderedDict
+
+from attendance_log import row_key
+from roster import normalize_phone, student_keys
+from scheduler import TokenBudget
+
+NOTIFY_BACKENDS = ("none", "file", "http")
+DEFAULT_OUTBOX = "notifications.jsonl"
+# Seconds the worker keeps collecting written submissions before messaging parents
+NOTIFY_BATCH_WINDOW = 5.0
+# Messages handed to the gateway per call, and the most sent per minute
+NOTIFY_BATCH_SIZE = 100
+NOTIFY_PER_MINUTE = 600
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 2.0
+HTTP_TIMEOUT = 30
+# Messages remembered for delivery status, and (parent, date, student) absences remembered as sent
+STATUS_HISTORY = 5000
+NOTIFIED_HISTORY = 100000
+
+QUEUED, SENDING, RETRYING, SENT, FAILED = "queued", "sending", "retrying", "sent", "failed"
+
+
+class FileGateway:
+    """Appends every message to a JSON-lines outbox; for testing, or for another process to deliver."""
+
+    def __init__(self, path=DEFAULT_OUTBOX):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, messages):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for message in messages:
+                f.write(json.dumps(message) + "\n")
+
+
+class HttpGateway:
+    """POSTs each batch as {"messages": [...]} JSON to an SMS provider's webhook or a local stub.
+
+    Any non-2xx answer fails the whole batch, which is then retried.
+    """
+
+    def __init__(self, url, token=None, timeout=HTTP_TIMEOUT):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+
+    def send(self, messages):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = urllib.request.Request(self.url, data=json.dumps({"messages": messages}).encode(),
+                                         headers=headers, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def open_gateway(settings):
+    """Build the gateway named by ``settings["backend"]`` ("none", "file" or "http"); None for "none"."""
+    backend = settings.get("backend", "none")
+    if backend == "none":
+        return None
+    if backend == "file":
+        return FileGateway(settings.get("path", DEFAULT_OUTBOX))
+    if backend == "http":
+        if not settings.get("url"):
+            raise ValueError("The http notification gateway needs a url.")
+        return HttpGateway(settings["url"], settings.get("token"))
+    raise ValueError(f"Unknown notification backend {backend!r}; expected one of {', '.join(NOTIFY_BACKENDS)}")
+
+
+def absence_text(day, students):
+    names = [f"{name} ({class_name})" for name, class_name, _ in students]
+    listed = names[0] if len(names) == 1 else ", ".join(names[:-1]) + " and " + names[-1]
+    verb = "was" if len(names) == 1 else "were"
+    return f"Attendance: {listed} {verb} marked absent on {day}."
+
+
+class AbsenceNotifier:
+    """Messages parents about absences once a submission has been written.
+
+    ``enqueue`` is called by the submission writer with each date it saved.
+    A background thread collects ``batch_window`` seconds of them, keeps the
+    latest mark per student and date, and writes one message per parent
+    number and date covering all of that parent's absent children, sent to
+    Parents Number 1 and (from the roster) Parents Number 2. Absences already
+    sent, e.g. on a re-submission of the same day, are not sent again.
+    Messages go to the gateway ``batch_size`` at a time within
+    ``per_minute``; failed batches are retried with jittered exponential
+    backoff, and ``status``/``counts`` report delivery for the UI.
+    """
+
+    def __init__(self, gateway, roster=None, batch_window=NOTIFY_BATCH_WINDOW, batch_size=NOTIFY_BATCH_SIZE,
+                 per_minute=NOTIFY_PER_MINUTE, max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_BASE_DELAY):
+        self.gateway = gateway
+        self.roster = roster
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self.budget = TokenBudget(per_minute)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue()
+        self._ids = itertools.count(1)
+        self._status = OrderedDict()
+        self._notified = OrderedDict()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="absence-notifier", daemon=True)
+        self._worker.start()
+
+    def enqueue(self, day, rows):
+        self._queue.put((day, rows))
+
+    def status(self, message_id):
+        with self._lock:
+            status = self._status.get(message_id)
+            return dict(status) if status else None
+
+    def counts(self):
+        """Number of remembered messages in each delivery state, plus dates still waiting to be batched."""
+        with self._lock:
+            counts = Counter(status["state"] for status in self._status.values())
+        return dict(counts) | {"pending dates": self._queue.qsize()}
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            messages = self._messages(batch)
+            for offset in range(0, len(messages), self.batch_size):
+                self._send(messages[offset:offset + self.batch_size])
+
+    def _messages(self, batch):
+        by_day = OrderedDict()
+        for day, rows in batch:
+            merged = by_day.setdefault(day, OrderedDict())
+            for row in rows:
+                merged[row_key(row)] = row
+
+        second = {}
+        try:
+            roster = self.roster() if self.roster else None
+        except Exception:
+            # Without the roster only Parents Number 1 (already on the log rows) is messaged
+            roster = None
+        if roster is not None and "Parents Number 2" in roster.columns:
+            second = dict(zip(student_keys(roster), roster["Parents Number 2"].astype(str).tolist()))
+
+        absences = OrderedDict()
+        for day, merged in by_day.items():
+            for row in merged.values():
+                if row[5] != "Absent":
+                    continue
+                student = (row[1], row[2], row[4])
+                # Dedupe first so a parent listed in both columns gets one message
+                for phone in dict.fromkeys(normalize_phone(p) for p in [row[4], second.get(student, "")]):
+                    if phone and (phone, day, student) not in self._notified:
+                        absences.setdefault((phone, day), []).append(student)
+
+        messages = []
+        with self._lock:
+            for (phone, day), students in absences.items():
+                message_id = next(self._ids)
+                messages.append({"id": message_id, "to": phone, "date": day,
+                                 "students": [list(student) for student in students],
+                                 "text": absence_text(day, students)})
+                self._status[message_id] = {"state": QUEUED, "to": phone, "date": day,
+                                            "students": len(students), "attempts": 0, "error": None}
+            while len(self._status) > STATUS_HISTORY:
+                self._status.popitem(last=False)
+        return messages
+
+    def _send(self, messages):
+        ids = [message["id"] for message in messages]
+        for _ in messages:
+            # Throughput cap; the worker simply waits for the budget to refill
+            while not self.budget.take():
+                pass
+        for attempt in range(1, self.max_attempts + 1):
+            self._set(ids, state=SENDING, attempts=attempt)
+            try:
+                self.gateway.send(messages)
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    self._set(ids, state=FAILED, error=str(e))
+                    return
+                self._set(ids, state=RETRYING, error=str(e))
+                time.sleep(self.retry_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            else:
+                self._set(ids, state=SENT, error=None)
+                for message in messages:
+                    for student in message["students"]:
+                        self._notified[(message["to"], message["date"], tuple(student))] = True
+                while len(self._notified) > NOTIFIED_HISTORY:
+                    self._notified.popitem(last=False)
+                return
+
+    def _set(self, ids, **changes):
+        with self._lock:
+            for message_id in ids:
+                if message_id in self._status:
+                    self._status[message_id].update(changes)
@@ -0,0 +1,249 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+import pandas as pd
+from googleapiclient.errors import HttpError
+
+from attendance_log import CHUNK_ROWS, LOG_SHEET, AttendanceLog, read_tabs
+from schema import typed_log
+from shared_cache import NullCache
+
+PARTITION_PREFIX = 'Attendance '
+# Closed months kept parsed in memory; they no longer change, so they never go stale
+FROZEN_CACHE_MONTHS = 12
+# How long the list of partition tabs is trusted before the sheet metadata is read again (seconds)
+CATALOG_TTL = 300
+
+_PARTITION_RE = re.compile(r'^Attendance (\d{4}-\d{2})$')
+
+
+def partition_name(month):
+    return f"{PARTITION_PREFIX}{month}"
+
+
+def month_of(day):
+    # Dates are stored as YYYY-MM-DD
+    return day[:7]
+
+
+class PartitionCatalog:
+    """Which month partitions exist, read from the spreadsheet's tab names.
+
+    A tab named "Attendance YYYY-MM" holds exactly the dates of that month.
+    The pre-partitioning 'Attendance Log' tab, if present, is kept as a legacy
+    partition whose date range comes from its row index. Grid row counts come
+    with the same metadata read; they are only current right after refresh().
+    """
+
+    def __init__(self, client, spreadsheet_id, ttl=CATALOG_TTL):
+        self.client = client
+        self.spreadsheet_id = spreadsheet_id
+        self.ttl = ttl
+        self._months = set()
+        self.row_counts = {}
+        self.has_legacy = False
+        self._loaded_at = None
+
+    def months(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+            self.refresh()
+        return sorted(self._months)
+
+    def refresh(self):
+        meta = self.client.execute(self.client.spreadsheets().get(
+            spreadsheetId=self.spreadsheet_id, fields="sheets.properties(title,gridProperties.rowCount)"))
+        titles = [sheet["properties"]["title"] for sheet in meta.get("sheets", [])]
+        self.row_counts = {sheet["properties"]["title"]: sheet["properties"].get("gridProperties", {}).get("rowCount", 0)
+                           for sheet in meta.get("sheets", [])}
+        self._months = {match.group(1) for match in map(_PARTITION_RE.match, titles) if match}
+        self.has_legacy = LOG_SHEET in titles
+        self._loaded_at = time.monotonic()
+
+    def overlapping(self, start=None, end=None):
+        return [month for month in self.months()
+                if (start is None or month >= month_of(start)) and (end is None or month <= month_of(end))]
+
+    def create(self, *months):
+        """Add the tabs of ``months`` and return the months this call actually created.
+
+        Several months are added in one batchUpdate, e.g. by a bulk import. A
+        tab another replica added meanwhile counts as existing, not as an error.
+        """
+        try:
+            self.client.execute(self.client.spreadsheets().batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={"requests": [{"addSheet": {"properties": {"title": partition_name(month)}}}
+                                   for month in months]}))
+        except HttpError as e:
+            # Sheets rejects the whole batch with a 400 if any of the tabs exists already
+            if e.resp.status != 400 or "already exists" not in str(e):
+                raise
+            self.refresh()
+            missing = [month for month in months if month not in self._months]
+            return self.create(*missing) if missing else []
+        self._months.update(months)
+        return list(months)
+
+
+class PartitionedAttendanceLog:
+    """Attendance log split into one tab per month.
+
+    Submits only touch the partition of the submitted date, so the date index
+    and any re-submission work stay within one month of rows. Readers pass a
+    date range and only the overlapping partitions are opened; months before
+    the current one are immutable in practice and are cached once read.
+
+    Closed months also go to the ``shared`` cache, tagged with a per-month
+    generation that any write into that month bumps, so one replica reads a
+    closed month from Sheets and the others take its copy.
+    """
+
+    def __init__(self, client, spreadsheet_id, frozen_months=FROZEN_CACHE_MONTHS, shared=None):
+        self.client = client
+        self.spreadsheet_id = spreadsheet_id
+        self.shared = shared or NullCache()
+        self.catalog = PartitionCatalog(client, spreadsheet_id)
+        self.frozen_months = frozen_months
+        self._partitions = {}
+        self._legacy = AttendanceLog(client, spreadsheet_id, sheet=LOG_SHEET)
+        self._frozen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def write_day(self, day, rows):
+        # Dates already in the legacy tab are corrected there so they never exist twice
+        if self._in_legacy(day):
+            return self._legacy.write_day(day, rows)
+
+        month = month_of(day)
+        with self._lock:
+            if month not in self.catalog.months():
+                # The cached list may predate another replica creating this month
+                self.catalog.refresh()
+                if month not in self.catalog.months():
+                    self.catalog.create(month)
+            self._thaw(month)
+        return self.partition(month).write_day(day, rows)
+
+    def import_rows(self, rows, chunk_rows=CHUNK_ROWS, progress=None):
+        """Bulk-append rows of many dates, each to its month (or the legacy tab for its dates).
+
+        Missing months are created in one request and each tab gets one
+        append per ``chunk_rows`` rows. ``progress(rows_written)`` reports the
+        running total. Rows must not exist yet; see importer.drop_existing.
+        """
+        self.catalog.refresh()
+        legacy_days = self._legacy.dates() if self.catalog.has_legacy else set()
+        tabs = {}
+        for row in sorted(rows, key=lambda row: row[0]):
+            tabs.setdefault(None if row[0] in legacy_days else month_of(row[0]), []).append(row)
+
+        with self._lock:
+            new = [month for month in tabs if month is not None and month not in self.catalog.months()]
+            if new:
+                # Months another replica created meanwhile already have rows and a header
+                new = self.catalog.create(*new)
+            for month in tabs:
+                if month is not None:
+                    self._thaw(month)
+
+        written = 0
+
+        def report(count):
+            nonlocal written
+            written += count
+            if progress:
+                progress(written)
+
+        for month, tab_rows in tabs.items():
+            log = self._legacy if month is None else self.partition(month)
+            log.append_rows(tab_rows, chunk_rows, new_tab=month in new, progress=report)
+
+    def _thaw(self, month):
+        # A written month is no longer frozen here, and the bump tells other replicas the same
+        self._frozen.pop(month, None)
+        self.shared.bump(f"partition {month}")
+
+    def partition(self, month):
+        with self._lock:
+            if month not in self._partitions:
+                self._partitions[month] = AttendanceLog(self.client, self.spreadsheet_id, sheet=partition_name(month))
+            return self._partitions[month]
+
+    def iter_chunks(self, chunk_rows=CHUNK_ROWS, start=None, end=None):
+        """Yield log chunks for dates in [start, end] (YYYY-MM-DD, either may be None).
+
+        One metadata read gives the current size of every tab; all tabs not
+        cached in memory are then streamed together through batched reads.
+        """
+        self.catalog.refresh()
+        for chunk in self._chunks(chunk_rows, start, end):
+            if start is not None:
+                chunk = chunk[chunk["Date"] >= start]
+            if end is not None:
+                chunk = chunk[chunk["Date"] <= end]
+            if not chunk.empty:
+                yield chunk
+
+    def _chunks(self, chunk_rows, start, end):
+        months = self.catalog.overlapping(start, end)
+        current = date.today().strftime("%Y-%m")
+        generations = {month: self.shared.generation(f"partition {month}") for month in months if month < current}
+        with self._lock:
+            frozen = {month: self._frozen[month][1] for month in generations
+                      if month in self._frozen and self._frozen[month][0] == generations[month]}
+            for month in frozen:
+                self._frozen.move_to_end(month)
+        for month in generations:
+            if month not in frozen:
+                shared = self.shared.get(f"partition {month}", generations[month])
+                if shared is not None:
+                    frozen[month] = shared
+                    self._freeze(month, generations[month], shared)
+
+        tabs = []
+        if self.catalog.has_legacy and self._legacy_overlaps(start, end):
+            tabs.append(LOG_SHEET)
+        tabs.extend(partition_name(month) for month in months if month not in frozen)
+        stream = read_tabs(self.client, self.spreadsheet_id,
+                           [(tab, self.catalog.row_counts.get(tab, 0)) for tab in tabs], chunk_rows)
+        pending = next(stream, None)
+
+        # Oldest first: the legacy tab, then months in order, frozen ones served from memory
+        while pending is not None and pending[0] == LOG_SHEET:
+            yield pending[1]
+            pending = next(stream, None)
+        for month in months:
+            if month in frozen:
+                for offset in range(0, len(frozen[month]), chunk_rows):
+                    yield frozen[month].iloc[offset:offset + chunk_rows]
+                continue
+            parts = []
+            while pending is not None and pending[0] == partition_name(month):
+                parts.append(pending[1])
+                yield pending[1]
+                pending = next(stream, None)
+            if month < current and parts:
+                # Chunks carry their own categories, so concat falls back to object; re-type once
+                frame = typed_log(pd.concat(parts, ignore_index=True))
+                self._freeze(month, generations[month], frame)
+                self.shared.set(f"partition {month}", generations[month], frame)
+
+    def _freeze(self, month, generation, frame):
+        with self._lock:
+            self._frozen[month] = (generation, frame)
+            self._frozen.move_to_end(month)
+            while len(self._frozen) > self.frozen_months:
+                self._frozen.popitem(last=False)
+
+    def _in_legacy(self, day):
+        self.catalog.months()
+        return self.catalog.has_legacy and day in self._legacy.dates()
+
+    def _legacy_overlaps(self, start, end):
+        days = self._legacy.dates()
+        if not days:
+            return False
+        return (start is None or max(days) >= start) and (end is None or min(days) <= end)
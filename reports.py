@@ -0,0 +1,162 @@
+import html
+import io
+import re
+import zipfile
+
+import pandas as pd
+
+from aggregates import KEY_COLUMNS
+from instrumentation import span
+from schema import DATE_FORMAT, typed_log
+
+REPORT_FORMATS = ("csv", "html", "pdf")
+# Students rendered between progress updates
+STUDENTS_PER_TASK = 100
+
+
+class ReportCard:
+    """Everything one student's report needs, detached from the log frame it came from."""
+
+    def __init__(self, name, class_name, teacher, parent1, dates, statuses):
+        self.name = name
+        self.class_name = class_name
+        self.teacher = teacher
+        self.parent1 = parent1
+        # Newest first and without "No Class" days, like the daily history on the summary page
+        self.history = sorted(((d, s) for d, s in zip(dates, statuses) if s != "No Class"), reverse=True)
+        self.present = sum(1 for _, s in self.history if s == "Present")
+        self.absent = sum(1 for _, s in self.history if s == "Absent")
+
+    @property
+    def percent(self):
+        total = self.present + self.absent
+        return 100 * self.present / total if total else None
+
+    @property
+    def filename(self):
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", f"{self.name}_{self.parent1}").strip("_")
+        return f"{re.sub(r'[^A-Za-z0-9]+', '_', self.class_name) or 'no_class'}/{slug}"
+
+
+def collect_cards(log_chunks, roster):
+    """Group one read of the log by student and return a ReportCard per roster student."""
+    with span("reports read"):
+        chunks = list(log_chunks)
+    with span("reports group"):
+        if chunks:
+            log = typed_log(pd.concat(chunks, ignore_index=True))
+            dates = log["Date"].dt.strftime(DATE_FORMAT).to_numpy()
+            statuses = log["Status"].astype(str).to_numpy()
+            groups = log.groupby(KEY_COLUMNS, observed=True, sort=False).indices
+        else:
+            dates = statuses = None
+            groups = {}
+
+        cards = []
+        for name, class_name, teacher, parent1 in zip(roster["Student Name"], roster["Class"].astype(str),
+                                                      roster["Teacher Name"].astype(str), roster["Parents Number 1"]):
+            rows = groups.get((name, class_name, parent1), [])
+            cards.append(ReportCard(name, class_name, teacher, parent1,
+                                    dates[rows] if len(rows) else [], statuses[rows] if len(rows) else []))
+        return cards
+
+
+def render_csv(card):
+    lines = ["Date,Status"] + [f"{day},{status}" for day, status in card.history]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def render_html(card):
+    percent = "n/a" if card.percent is None else f"{card.percent:.2f}%"
+    rows = "".join(f"<tr><td>{day}</td><td>{html.escape(status)}</td></tr>" for day, status in card.history)
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Attendance report - {html.escape(card.name)}</title></head>
+<body>
+<h1>Attendance report</h1>
+<p><b>Student Name:</b> {html.escape(card.name)}<br><b>Class:</b> {html.escape(card.class_name)}<br>
+<b>Teacher:</b> {html.escape(card.teacher)}<br><b>Parent 1:</b> {html.escape(card.parent1)}</p>
+<p><b>Present:</b> {card.present} &nbsp; <b>Absent:</b> {card.absent} &nbsp; <b>Attendance %:</b> {percent}</p>
+<table border="1" cellpadding="4"><tr><th>Date</th><th>Status</th></tr>{rows}</table>
+</body></html>
+""".encode()
+
+
+def render_pdf(card):
+    try:
+        from fpdf import FPDF
+    except ImportError:
+        raise ValueError("PDF reports need the fpdf2 package; choose CSV or HTML instead.")
+
+    def text(value):
+        # The built-in PDF fonts only cover Latin-1
+        return str(value).encode("latin-1", "replace").decode("latin-1")
+
+    percent = "n/a" if card.percent is None else f"{card.percent:.2f}%"
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Helvetica", "B", 16)
+    pdf.cell(0, 10, "Attendance report", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Helvetica", size=11)
+    for label, value in [("Student Name", card.name), ("Class", card.class_name), ("Teacher", card.teacher),
+                         ("Parent 1", card.parent1), ("Present", card.present), ("Absent", card.absent),
+                         ("Attendance %", percent)]:
+        pdf.cell(0, 7, text(f"{label}: {value}"), new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(4)
+    pdf.set_font("Helvetica", "B", 11)
+    pdf.cell(40, 7, "Date", border=1)
+    pdf.cell(40, 7, "Status", border=1, new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Helvetica", size=11)
+    for day, status in card.history:
+        pdf.cell(40, 7, day, border=1)
+        pdf.cell(40, 7, text(status), border=1, new_x="LMARGIN", new_y="NEXT")
+    return bytes(pdf.output())
+
+
+RENDERERS = {"csv": render_csv, "html": render_html, "pdf": render_pdf}
+
+
+def render_cards(cards, formats):
+    # [(path in the zip, file bytes), ...]
+    return [(f"{card.filename}.{fmt}", RENDERERS[fmt](card)) for card in cards for fmt in formats]
+
+
+def summary_csv(cards):
+    table = pd.DataFrame({
+        "Student Name": [card.name for card in cards], "Class": [card.class_name for card in cards],
+        "Parent 1": [card.parent1 for card in cards], "Present": [card.present for card in cards],
+        "Absent": [card.absent for card in cards],
+        "Attendance %": [None if card.percent is None else round(card.percent, 2) for card in cards],
+    })
+    return table.to_csv(index=False).encode()
+
+
+def build_report_zip(log_chunks, roster, formats=("csv", "html"), progress=None):
+    """Render a report card per roster student and return them zipped, one folder per class.
+
+    The log is read once and grouped by student here, then the cards are
+    rendered in this thread in batches of STUDENTS_PER_TASK.
+    ``progress(done, total)`` is called as batches finish. There is no worker
+    pool: forking the multithreaded Streamlit server can deadlock the child,
+    spawned or forkserver workers re-run the app script (it is __main__), and
+    threads gain nothing on this GIL-bound rendering.
+    """
+    unknown = [fmt for fmt in formats if fmt not in RENDERERS]
+    if unknown:
+        raise ValueError(f"Unknown report format(s): {', '.join(unknown)}")
+    if "pdf" in formats:
+        # Fail before reading the log rather than at the first card
+        render_pdf(ReportCard("", "", "", "", [], []))
+
+    cards = collect_cards(log_chunks, roster)
+    batches = [cards[offset:offset + STUDENTS_PER_TASK] for offset in range(0, len(cards), STUDENTS_PER_TASK)]
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive, span("reports render"):
+        archive.writestr("summary.csv", summary_csv(cards))
+        done = 0
+        for batch in batches:
+            for path, data in render_cards(batch, formats):
+                archive.writestr(path, data)
+            done += len(batch)
+            if progress:
+                progress(done, len(cards))
+    return buffer.getvalue()
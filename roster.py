@@ -0,0 +1,131 @@
+from collections import namedtuple
+
+import pandas as pd
+
+from instrumentation import span
+from schema import typed_roster
+from shared_cache import VersionedCache
+
+# Sheet range holding the roster and the columns that come back as floats from Sheets
+ROSTER_RANGE = 'S1 - Student Details'
+PHONE_COLUMNS = ['Parents Number 1', 'Parents Number 2', "Teacher Phone Number", "Password"]
+LOGIN_COLUMNS = ['Parents Number 1', 'Parents Number 2', "Teacher Phone Number"]
+# What identifies a student across roster versions; sessions keep these instead of roster rows
+STUDENT_KEY = ["Student Name", "Class", "Parents Number 1"]
+
+# How long a cached roster is trusted before the sheet revision is checked again (seconds)
+ROSTER_TTL = 60
+
+
+# role is "Teacher" or "Parent"; rows are positional indexes into the roster
+PhoneEntry = namedtuple("PhoneEntry", ["role", "rows"])
+
+
+def normalize_phone(value):
+    # Same cleanup load_data has always applied to the phone columns
+    return str(value).replace(".0", "").replace(" ", "").strip()
+
+
+def build_phone_index(df):
+    """Map every login phone number to its role and the roster rows it may see."""
+    rows = {}
+    teachers = set()
+    for col in LOGIN_COLUMNS:
+        if col not in df.columns:
+            continue
+        for pos, phone in enumerate(df[col].tolist()):
+            if not phone:
+                continue
+            rows.setdefault(phone, set()).add(pos)
+            if col == "Teacher Phone Number":
+                teachers.add(phone)
+
+    index = {}
+    for phone, positions in rows.items():
+        positions = tuple(sorted(positions))
+        # A number on several students, or in the teacher column, logs in as a teacher
+        role = "Teacher" if phone in teachers or len(positions) > 1 else "Parent"
+        index[phone] = PhoneEntry(role, positions)
+    return index
+
+
+def student_keys(df):
+    # (name, class, first parent number) of every row, in order
+    if any(col not in df.columns for col in STUDENT_KEY):
+        return []
+    return list(zip(*(df[col].astype(str).tolist() for col in STUDENT_KEY)))
+
+
+def build_key_index(df):
+    """Map every student key to its roster position."""
+    return {key: pos for pos, key in enumerate(student_keys(df))}
+
+
+def clean_roster(values):
+    """Turn the raw sheet values into the roster DataFrame used by the app."""
+    if not values:
+        raise ValueError("No data found.")
+
+    df = pd.DataFrame(values[1:], columns=values[0])
+
+    for col in PHONE_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.replace(".0", "", regex=False).str.strip()
+    return typed_roster(df)
+
+
+class RosterCache(VersionedCache):
+    """One parsed roster shared by every session in the process.
+
+    After ``ttl`` seconds the sheet revision is checked with ``fetch_version``;
+    the roster is only downloaded again (``fetch_values``) when the revision
+    moved or could not be read. The cached DataFrame is shared, so callers must
+    treat it as read-only.
+
+    With a ``shared`` cache (see shared_cache.py) the parsed roster of each
+    revision is downloaded by one replica and picked up by the rest, and a
+    Refresh Roster on any replica makes all of them check the revision again.
+    """
+
+    def __init__(self, fetch_values, fetch_version=None, ttl=ROSTER_TTL, shared=None):
+        super().__init__("roster", "roster", fetch_version, ttl, shared)
+        self.fetch_values = fetch_values
+        self._phone_index = {}
+        self._key_index = {}
+
+    def lookup_phone(self, phone):
+        """Return (role, roster rows) for a login number, or None if it is unknown."""
+        with self._lock:
+            df = self._refresh()
+            entry = self._phone_index.get(normalize_phone(phone))
+            if entry is None:
+                return None
+            return entry.role, df.iloc[list(entry.rows)]
+
+    def students(self, keys):
+        """Current roster rows of the given student keys; keys no longer on the roster are skipped."""
+        with self._lock:
+            df = self._refresh()
+            return df.iloc[[self._key_index[key] for key in keys if key in self._key_index]]
+
+    def _build(self):
+        with span("roster fetch"):
+            values = self.fetch_values()
+        with span("roster parse"):
+            return clean_roster(values)
+
+    def _adopt(self, df):
+        # The login index is rebuilt only when a new roster version is parsed
+        with span("login index build"):
+            self._phone_index = build_phone_index(df)
+            self._key_index = build_key_index(df)
+
+    def invalidate(self):
+        # Force a full download on the next get(), whatever the revision says; other replicas re-check
+        self.shared.delete("roster")
+        self.shared.bump("roster")
+        super().invalidate()
+
+    def _current_version(self):
+        with span("roster version check"):
+            return super()._current_version()
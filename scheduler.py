@@ -0,0 +1,172 @@
+import http.client
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import httplib2
+from google.auth.exceptions import TransportError
+from googleapiclient.errors import HttpError
+
+from instrumentation import SHEETS_QUOTA_PER_MINUTE, span
+
+# Statuses worth another try; 5xx only for reads, since a failed write may still have been applied
+THROTTLED = 429
+RETRY_STATUSES = {500, 502, 503, 504}
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 32.0
+# Failures below HTTP: timeouts, resets, DNS, token refresh; retried like a 5xx
+TRANSPORT_ERRORS = (OSError, http.client.HTTPException, httplib2.HttpLib2Error, TransportError)
+# Longest a request waits for budget before the caller is told Sheets is busy (seconds)
+MAX_BUDGET_WAIT = 10.0
+
+
+class SheetsUnavailable(Exception):
+    """Sheets kept refusing or could not be reached after every retry, or the budget ran dry."""
+
+
+class TokenBudget:
+    """Token bucket refilled at ``per_minute`` / 60 tokens a second, holding at most ``per_minute``."""
+
+    def __init__(self, per_minute=SHEETS_QUOTA_PER_MINUTE):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self._tokens = float(per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, timeout=MAX_BUDGET_WAIT):
+        """Spend one token, waiting for the refill up to ``timeout`` seconds; False if it never came."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def drain(self):
+        # Sheets said 429: whatever we think is left, it is not
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+
+    def available(self):
+        with self._lock:
+            self._refill()
+            return int(self._tokens)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class RequestScheduler:
+    """Gate between every session and the Sheets/Drive APIs.
+
+    Each request spends a token of the per-minute budget first. Identical
+    GETs already in flight are coalesced: later callers wait for the first
+    one's response instead of sending their own, unless a write finished
+    since that GET was sent, so a read-modify-write never sees an old read. A 429 (any method), or a
+    5xx or network failure on a read, is retried with full-jitter exponential
+    backoff, honouring Retry-After; a 429 also drains the budget so other
+    sessions slow down.
+    When nothing works the caller gets SheetsUnavailable, and the caches
+    above fall back to the copy they already hold.
+    """
+
+    def __init__(self, per_minute=SHEETS_QUOTA_PER_MINUTE, max_attempts=MAX_ATTEMPTS,
+                 backoff_base=BACKOFF_BASE, backoff_cap=BACKOFF_CAP, max_wait=MAX_BUDGET_WAIT):
+        self.budget = TokenBudget(per_minute)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._writes = 0
+        self._counts = Counter()
+
+    def run(self, request, send):
+        """Send ``request`` with ``send(request)`` under the budget, coalescing and retry rules."""
+        if getattr(request, "method", None) != "GET":
+            try:
+                return self._send(request, send, retry_errors=False)
+            finally:
+                # Reads sent before this write finished may predate it; later reads must not join them
+                with self._lock:
+                    self._writes += 1
+        with self._lock:
+            key = (request.uri, self._writes)
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = Future()
+        if not leader:
+            self._count("coalesced")
+            return call.result()
+        try:
+            result = self._send(request, send, retry_errors=True)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self):
+        """Counters since start: sent, coalesced, retried, throttled, unavailable; plus budget left."""
+        with self._lock:
+            return dict(self._counts) | {"budget left": self.budget.available()}
+
+    def _send(self, request, send, retry_errors):
+        for attempt in range(1, self.max_attempts + 1):
+            if not self.budget.take(self.max_wait):
+                self._count("unavailable")
+                raise SheetsUnavailable("The Sheets request budget is used up; try again in a minute.")
+            try:
+                self._count("sent")
+                return send(request)
+            except HttpError as e:
+                status = e.resp.status
+                if status == THROTTLED:
+                    self._count("throttled")
+                    self.budget.drain()
+                elif not (retry_errors and status in RETRY_STATUSES):
+                    raise
+                if attempt == self.max_attempts:
+                    self._count("unavailable")
+                    raise SheetsUnavailable(f"Sheets is not answering (HTTP {status}); try again in a minute.") from e
+                self._count("retried")
+                with span("sheets backoff"):
+                    time.sleep(self._delay(attempt, e.resp.get("retry-after")))
+            except TRANSPORT_ERRORS as e:
+                if not retry_errors:
+                    raise
+                if attempt == self.max_attempts:
+                    self._count("unavailable")
+                    raise SheetsUnavailable(f"Sheets could not be reached ({e}); try again in a minute.") from e
+                self._count("retried")
+                with span("sheets backoff"):
+                    time.sleep(self._delay(attempt))
+
+    def _delay(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        try:
+            return max(delay, float(retry_after))
+        except (TypeError, ValueError):
+            return delay
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
@@ -0,0 +1,42 @@
+import pandas as pd
+
+# Dates are stored in the sheets as text in this format
+DATE_FORMAT = "%Y-%m-%d"
+
+# Log columns that repeat on every school day; categoricals keep one copy per distinct value.
+# Phone numbers are identity keys that may carry "+", leading zeros or blanks, so they are
+# categorised too (fixed-width integer codes) rather than parsed as numbers.
+LOG_CATEGORIES = ["Student Name", "Class", "Teacher", "Parent 1", "Status"]
+ROSTER_CATEGORIES = ["Class", "Teacher Name"]
+
+
+def typed_log(df):
+    """Convert a log DataFrame of strings to compact dtypes, in place; safe to call twice.
+
+    Date becomes datetime64 (unparsable cells become NaT) and the repeating
+    text columns become categoricals, so filters and sorts run on native
+    arrays. Comparisons against "YYYY-MM-DD" strings keep working.
+    """
+    if "Date" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["Date"]):
+        df["Date"] = pd.to_datetime(df["Date"], format=DATE_FORMAT, errors="coerce")
+    for col in LOG_CATEGORIES:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+
+def typed_roster(df):
+    """Categorise the roster's low-cardinality columns, in place.
+
+    Names, phone numbers and passwords stay strings: they are unique per
+    student and are matched against typed-in text at login.
+    """
+    for col in ROSTER_CATEGORIES:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def format_dates(series):
+    # Back to the sheet's text form, e.g. for values written to the summary tab
+    return series.dt.strftime(DATE_FORMAT).fillna("")
@@ -0,0 +1,339 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager
+
+SHARED_CACHE_BACKENDS = ("none", "file", "redis")
+DEFAULT_CACHE_DIR = ".attendance-cache"
+# A version read from Drive by one replica is reused by the others for this long (seconds)
+VERSION_SHARE_TTL = 30
+# Channel that carries invalidation messages on the Redis backend
+INVALIDATION_CHANNEL = "attendance:invalidate"
+# How long one replica may hold the right to build an entry before others give up waiting (seconds)
+LEASE_TIMEOUT = 60
+LEASE_POLL = 0.2
+
+
+class NullCache:
+    """No sharing: every replica fetches and parses for itself, as before.
+
+    The shared tiers below hold one entry per kind ("roster", "analytics",
+    ...) tagged with the data version it was built from, so a replica only
+    takes an entry for the exact version it is looking for. Generations are
+    per-name counters; bumping one is the invalidation message every replica
+    sees on its next read. Entries are pickles, so the cache must only be
+    writable by the app's own replicas.
+    """
+
+    def get(self, kind, version):
+        return None
+
+    def set(self, kind, version, value):
+        pass
+
+    def delete(self, kind):
+        pass
+
+    def generation(self, name):
+        return 0
+
+    def bump(self, name):
+        return 0
+
+    def checked_version(self, name, fetch, ttl=VERSION_SHARE_TTL):
+        """Return ``fetch()``, or the value another replica fetched within ``ttl`` seconds.
+
+        A bump of ``name`` since that fetch forces a new one, so after a
+        submit exactly one replica goes back to Drive for the new version.
+        """
+        return fetch()
+
+    def fetch(self, kind, version, build, timeout=LEASE_TIMEOUT):
+        """Return the entry of ``kind`` for ``version``, calling ``build()`` only if no replica has it.
+
+        While one replica builds, the others wait up to ``timeout`` seconds
+        for its result instead of going to Sheets themselves. A None version
+        is never shared.
+        """
+        return build()
+
+    @contextmanager
+    def lease(self, name, timeout=LEASE_TIMEOUT):
+        """Hold ``name`` against every other replica for the duration of the block.
+
+        Without a shared tier there is nobody to coordinate with, so this
+        only covers a single server process.
+        """
+        yield
+
+
+class _SharedCache(NullCache):
+    # Shared-version and lease logic on top of a backend's get/set/generation/_acquire/_release
+
+    def checked_version(self, name, fetch, ttl=VERSION_SHARE_TTL):
+        generation = self.generation(name)
+        checked = self.get(f"{name} version", generation)
+        if checked is not None and time.time() - checked[1] < ttl:
+            return checked[0]
+        version = fetch()
+        if version is not None:
+            self.set(f"{name} version", generation, (version, time.time()))
+        return version
+
+    def fetch(self, kind, version, build, timeout=LEASE_TIMEOUT):
+        if version is None:
+            return build()
+        value = self.get(kind, version)
+        if value is not None:
+            return value
+        deadline = time.monotonic() + timeout
+        acquired = self._acquire(kind, timeout)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(LEASE_POLL)
+            value = self.get(kind, version)
+            if value is not None:
+                return value
+            acquired = self._acquire(kind, timeout)
+        try:
+            # The previous holder may have finished between our last look and the lease
+            value = self.get(kind, version) if acquired else None
+            if value is None:
+                value = build()
+                self.set(kind, version, value)
+            return value
+        finally:
+            if acquired:
+                self._release(kind)
+
+    @contextmanager
+    def lease(self, name, timeout=LEASE_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while not self._acquire(name, timeout):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Another replica has held {name!r} for over {timeout} seconds.")
+            time.sleep(LEASE_POLL)
+        try:
+            yield
+        finally:
+            self._release(name)
+
+
+class FileCache(_SharedCache):
+    """Shared tier in a directory that all replicas on the machine (or a shared volume) can see.
+
+    Each kind is one pickle file replaced atomically. A generation is the
+    length of an append-only file, so bumping is a one-byte O_APPEND write
+    and reading it is a stat.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name, suffix):
+        return os.path.join(self.directory, hashlib.sha1(name.encode()).hexdigest()[:16] + suffix)
+
+    def get(self, kind, version):
+        try:
+            with open(self._path(kind, ".pkl"), "rb") as f:
+                stored_version, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return value if stored_version == version else None
+
+    def set(self, kind, version, value):
+        path = self._path(kind, ".pkl")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump((version, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def delete(self, kind):
+        try:
+            os.remove(self._path(kind, ".pkl"))
+        except FileNotFoundError:
+            pass
+
+    def generation(self, name):
+        try:
+            return os.stat(self._path(name, ".gen")).st_size
+        except FileNotFoundError:
+            return 0
+
+    def bump(self, name):
+        fd = os.open(self._path(name, ".gen"), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, b".")
+        finally:
+            os.close(fd)
+        return self.generation(name)
+
+    def _acquire(self, kind, timeout):
+        path = self._path(kind, ".lock")
+        try:
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+            return True
+        except FileExistsError:
+            pass
+        try:
+            # A replica that died mid-build leaves its lock behind
+            if time.time() - os.stat(path).st_mtime > timeout:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        return False
+
+    def _release(self, kind):
+        try:
+            os.remove(self._path(kind, ".lock"))
+        except FileNotFoundError:
+            pass
+
+
+class RedisCache(_SharedCache):
+    """Shared tier on any Redis-protocol server (Redis, Valkey, KeyDB) next to the replicas.
+
+    Bumps also publish the name on INVALIDATION_CHANNEL for anything that
+    wants to listen; replicas themselves just compare generations.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", prefix="attendance:"):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("The redis shared cache needs the redis package (pip install redis).")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, kind, version):
+        data = self.client.get(self.prefix + kind)
+        if data is None:
+            return None
+        stored_version, value = pickle.loads(data)
+        return value if stored_version == version else None
+
+    def set(self, kind, version, value):
+        self.client.set(self.prefix + kind, pickle.dumps((version, value), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def delete(self, kind):
+        self.client.delete(self.prefix + kind)
+
+    def generation(self, name):
+        return int(self.client.get(f"{self.prefix}gen:{name}") or 0)
+
+    def bump(self, name):
+        generation = self.client.incr(f"{self.prefix}gen:{name}")
+        self.client.publish(INVALIDATION_CHANNEL, name)
+        return generation
+
+    def _acquire(self, kind, timeout):
+        return bool(self.client.set(f"{self.prefix}lock:{kind}", os.getpid(), nx=True, ex=int(timeout)))
+
+    def _release(self, kind):
+        self.client.delete(f"{self.prefix}lock:{kind}")
+
+
+class VersionedCache:
+    """One value per data version, built once and shared by every session in the process.
+
+    After ``ttl`` seconds the version is checked again with ``fetch_version``,
+    and the value is only rebuilt when the version moved or could not be read.
+    A bump of the ``generation`` name on the ``shared`` tier cuts the ttl
+    short, and through ``shared.fetch`` each version is built by one replica
+    only. When a rebuild fails while an older value is held, that value keeps
+    being served (``stale_since`` says since when) until the next ttl.
+
+    Subclasses implement ``_build`` and may override ``_adopt`` to derive
+    per-process state (indexes and the like) from a newly taken value. The
+    value is shared, so callers must treat it as read-only.
+    """
+
+    def __init__(self, kind, generation, fetch_version=None, ttl=60, shared=None):
+        self.kind = kind
+        self.generation = generation
+        self.fetch_version = fetch_version
+        self.ttl = ttl
+        self.shared = shared or NullCache()
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+        self._generation = None
+        self._checked_at = 0.0
+        # Wall time of the first failed rebuild while an older value is being served, else None
+        self.stale_since = None
+
+    def get(self):
+        with self._lock:
+            return self._refresh()
+
+    def due(self):
+        """True when the next get() would check the version again."""
+        return (self._value is None or time.monotonic() - self._checked_at >= self.ttl
+                or self.shared.generation(self.generation) != self._generation)
+
+    def invalidate(self):
+        # Rebuild on the next get(), whatever the version says
+        with self._lock:
+            self._value = None
+            self._version = None
+            self._checked_at = 0.0
+
+    @property
+    def version(self):
+        return self._version
+
+    def _refresh(self):
+        # Callers hold self._lock
+        generation = self.shared.generation(self.generation)
+        if (self._value is not None and time.monotonic() - self._checked_at < self.ttl
+                and generation == self._generation):
+            return self._value
+
+        version = self._current_version()
+        if self._value is None or version is None or version != self._version:
+            try:
+                value = self.shared.fetch(self.kind, version, self._build)
+            except Exception:
+                if self._value is None:
+                    raise
+                # Sheets is busy or down: keep serving the last value and try again after ttl
+                self.stale_since = self.stale_since or time.time()
+                self._generation = generation
+                self._checked_at = time.monotonic()
+                return self._value
+            self._adopt(value)
+            self._value = value
+            self._version = version
+        self.stale_since = None
+        self._generation = generation
+        self._checked_at = time.monotonic()
+        return self._value
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _adopt(self, value):
+        pass
+
+    def _current_version(self):
+        if self.fetch_version is None:
+            return None
+        try:
+            return self.fetch_version()
+        except Exception:
+            # The version check is best effort; an unknown version means "build again"
+            return None
+
+
+def open_shared_cache(settings):
+    """Build the tier named by ``settings["backend"]`` ("none", "file" or "redis")."""
+    backend = settings.get("backend", "none")
+    if backend == "none":
+        return NullCache()
+    if backend == "file":
+        return FileCache(settings.get("path", DEFAULT_CACHE_DIR))
+    if backend == "redis":
+        return RedisCache(settings.get("url", "redis://localhost:6379/0"))
+    raise ValueError(f"Unknown shared cache backend {backend!r}; expected one of {', '.join(SHARED_CACHE_BACKENDS)}")
@@ -0,0 +1,144 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import google_auth_httplib2
+import httplib2
+from google.oauth2.service_account import Credentials
+from googleapiclient.discovery import build
+
+from instrumentation import METRICS, record_api_call, span
+from scheduler import RequestScheduler
+
+# Refresh the access token this long before Google says it expires
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+# Idle authorized connections kept around for reuse
+HTTP_POOL_SIZE = 8
+HTTP_TIMEOUT = 30
+
+
+class _MeteredHttp(google_auth_httplib2.AuthorizedHttp):
+    # Counts every HTTP exchange and its payload size for the performance panel
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        resp, content = super().request(uri, method, body=body, headers=headers, **kwargs)
+        record_api_call(len(body or b"") + len(content or b""))
+        return resp, content
+
+
+class SheetsClient:
+    """Process-wide Sheets/Drive client shared by every Streamlit session.
+
+    The service objects are built once from the discovery documents bundled
+    with google-api-python-client, so no discovery request goes over the
+    network. httplib2 connections are not thread-safe, so each request runs on
+    an authorized connection checked out of a small pool; the OAuth token is
+    shared and refreshed under a lock shortly before it expires.
+
+    Between begin_rerun() and end_rerun() a thread keeps the responses of its
+    GET requests, so a page reading the same range twice sees one snapshot
+    and pays for one call. Any write from that thread drops the snapshot.
+
+    Everything that does go out passes through a RequestScheduler (quota
+    budget, coalescing of identical reads, retries with backoff).
+    """
+
+    def __init__(self, service_account_info, scopes, pool_size=HTTP_POOL_SIZE, scheduler=None):
+        with span("credentials"):
+            self.credentials = Credentials.from_service_account_info(service_account_info, scopes=scopes)
+        self._token_lock = threading.Lock()
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._local = threading.local()
+        self.scheduler = scheduler or RequestScheduler()
+        # Workers for run_parallel(); one per pooled connection is enough
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="sheets")
+        with span("build"):
+            self._sheets = build('sheets', 'v4', credentials=self.credentials,
+                                 static_discovery=True, cache_discovery=False)
+            self._drive = build('drive', 'v3', credentials=self.credentials,
+                                static_discovery=True, cache_discovery=False)
+
+    def spreadsheets(self):
+        return self._sheets.spreadsheets()
+
+    def files(self):
+        return self._drive.files()
+
+    def execute(self, request):
+        # Build requests from spreadsheets()/files(), then run them here on a pooled connection
+        responses = getattr(self._local, "responses", None)
+        if responses is None:
+            return self._execute(request)
+        if getattr(request, "method", None) != "GET":
+            responses.clear()
+            return self._execute(request)
+        # Requests for the same URI are the same read; the first one of the rerun wins
+        key = request.uri
+        if key not in responses:
+            responses[key] = self._execute(request)
+        return responses[key]
+
+    def begin_rerun(self):
+        self._local.responses = {}
+
+    def end_rerun(self):
+        self._local.responses = None
+
+    def run_parallel(self, jobs):
+        """Run independent zero-argument callables side by side and return their results in order.
+
+        Workers share the caller's response cache and rerun timings, so
+        reads from two spreadsheets cost the slower of the two, not the sum.
+        """
+        responses = getattr(self._local, "responses", None)
+
+        def run(job):
+            self._local.responses = responses
+            try:
+                return job()
+            finally:
+                self._local.responses = None
+
+        futures = [self._executor.submit(METRICS.bind(run), job) for job in jobs]
+        return [future.result() for future in futures]
+
+    def _execute(self, request):
+        return self.scheduler.run(request, self._send)
+
+    def _send(self, request):
+        self._ensure_token()
+        with self._http() as http:
+            return request.execute(http=http)
+
+    def _ensure_token(self):
+        creds = self.credentials
+        if creds.token and not self._expiring(creds):
+            return
+        with self._token_lock:
+            # Another session may have refreshed while we waited for the lock
+            if creds.token and not self._expiring(creds):
+                return
+            with span("token refresh"):
+                creds.refresh(google_auth_httplib2.Request(httplib2.Http(timeout=HTTP_TIMEOUT)))
+
+    @staticmethod
+    def _expiring(creds):
+        if creds.expiry is None:
+            return False
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now < TOKEN_REFRESH_MARGIN
+
+    @contextmanager
+    def _http(self):
+        try:
+            http = self._pool.get_nowait()
+        except queue.Empty:
+            http = _MeteredHttp(self.credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        try:
+            yield http
+        finally:
+            try:
+                self._pool.put_nowait(http)
+            except queue.Full:
+                pass
@@ -0,0 +1,257 @@
+import json
+import sqlite3
+import threading
+
+import pandas as pd
+
+from aggregates import COUNT_COLUMNS, StudentAggregates
+from attendance_log import CHUNK_ROWS, LOG_HEADERS, row_key
+from partitions import PartitionedAttendanceLog
+from roster import ROSTER_RANGE
+from schema import typed_log
+from shared_cache import NullCache
+
+BACKENDS = ("sheets", "sqlite")
+DEFAULT_DB_PATH = "attendance.db"
+
+
+class SheetsStorage:
+    """Google Sheets engine: roster in one spreadsheet, monthly log tabs and the summary tab in another."""
+
+    name = "sheets"
+
+    def __init__(self, client, roster_spreadsheet_id, log_spreadsheet_id, shared=None):
+        self.client = client
+        self.roster_spreadsheet_id = roster_spreadsheet_id
+        self.log_spreadsheet_id = log_spreadsheet_id
+        # Tier shared with the other server processes; see shared_cache.py
+        self.shared = shared or NullCache()
+        self.log = PartitionedAttendanceLog(client, log_spreadsheet_id, shared=self.shared)
+        self.aggregates = StudentAggregates(client, log_spreadsheet_id, self.log, shared=self.shared)
+
+    def roster_values(self):
+        result = self.client.execute(self.client.spreadsheets().values().get(
+            spreadsheetId=self.roster_spreadsheet_id,
+            range=ROSTER_RANGE
+        ))
+        return result.get('values', [])
+
+    def roster_version(self):
+        # Drive keeps a revision number per file, far cheaper to read than the sheet itself
+        return self.shared.checked_version("roster", lambda: self._drive_version(self.roster_spreadsheet_id))
+
+    def log_version(self):
+        # Moves on any edit of the log spreadsheet, including hand edits
+        return self.shared.checked_version("log", lambda: self._drive_version(self.log_spreadsheet_id))
+
+    def _drive_version(self, file_id):
+        request = self.client.files().get(fileId=file_id, fields='version')
+        return self.client.execute(request).get('version')
+
+    def begin_rerun(self):
+        self.client.begin_rerun()
+
+    def end_rerun(self):
+        self.client.end_rerun()
+
+    def run_parallel(self, jobs):
+        # Roster and log live in different spreadsheets, so their reads can overlap
+        return self.client.run_parallel(jobs)
+
+
+class SQLiteStorage:
+    """Local engine with indexed roster, attendance and summary tables.
+
+    It serves the same calls as SheetsStorage from a single SQLite file, so
+    the app (and anything exercising it) can run without Google credentials.
+    Each thread gets its own connection; WAL mode lets readers run while a
+    teacher's submit is being written.
+    """
+
+    name = "sqlite"
+    # Every process already reads the same file; there is nothing to share on top
+    shared = NullCache()
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self.connect() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS roster (position INTEGER PRIMARY KEY, data TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS attendance (
+                    id INTEGER PRIMARY KEY,
+                    date TEXT NOT NULL, student_name TEXT, class TEXT,
+                    teacher TEXT, parent1 TEXT, status TEXT);
+                CREATE INDEX IF NOT EXISTS attendance_date ON attendance (date);
+                CREATE INDEX IF NOT EXISTS attendance_student ON attendance (student_name, class, parent1);
+                CREATE TABLE IF NOT EXISTS summary (
+                    student_name TEXT, class TEXT, parent1 TEXT,
+                    present INTEGER NOT NULL DEFAULT 0, absent INTEGER NOT NULL DEFAULT 0,
+                    no_class INTEGER NOT NULL DEFAULT 0, last_seen TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (student_name, class, parent1));
+            """)
+        self.log = SQLiteAttendanceLog(self)
+        self.aggregates = SQLiteAggregates(self)
+
+    def connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def roster_values(self):
+        rows = self.connect().execute("SELECT data FROM roster ORDER BY position").fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def roster_version(self):
+        row = self.connect().execute("SELECT value FROM meta WHERE key = 'roster_version'").fetchone()
+        return row[0] if row else None
+
+    def log_version(self):
+        row = self.connect().execute("SELECT value FROM meta WHERE key = 'log_version'").fetchone()
+        return row[0] if row else None
+
+    def _bump_log_version(self, db):
+        # Called inside the write transaction, so readers see the rows and the version together
+        version = int(self.log_version() or 0) + 1
+        db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('log_version', ?)", (str(version),))
+
+    def begin_rerun(self):
+        pass
+
+    def end_rerun(self):
+        pass
+
+    def run_parallel(self, jobs):
+        # Local reads are cheap; there is no latency to overlap
+        return [job() for job in jobs]
+
+    def replace_roster(self, values):
+        """Load a roster (header row first, as Sheets returns it) into the local database."""
+        with self._write_lock, self.connect() as db:
+            db.execute("DELETE FROM roster")
+            db.executemany("INSERT INTO roster (position, data) VALUES (?, ?)",
+                           [(pos, json.dumps(list(row))) for pos, row in enumerate(values)])
+            version = int(self.roster_version() or 0) + 1
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('roster_version', ?)", (str(version),))
+
+
+class SQLiteAttendanceLog:
+    """SQLite counterpart of AttendanceLog."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def write_day(self, day, rows):
+        keys = {row_key(row) for row in rows}
+        with self.storage._write_lock, self.storage.connect() as db:
+            existing = db.execute(
+                "SELECT id, date, student_name, class, teacher, parent1, status FROM attendance "
+                "WHERE date = ? ORDER BY id", (day,)).fetchall()
+            replaced = [row for row in existing if row_key(row[1:]) in keys]
+            db.executemany("DELETE FROM attendance WHERE id = ?", [(row[0],) for row in replaced])
+            db.executemany(
+                "INSERT INTO attendance (date, student_name, class, teacher, parent1, status) "
+                "VALUES (?, ?, ?, ?, ?, ?)", [tuple(row) for row in rows])
+            self.storage._bump_log_version(db)
+        return [list(row[1:]) for row in replaced]
+
+    def import_rows(self, rows, chunk_rows=CHUNK_ROWS, progress=None):
+        # One transaction per chunk keeps the write lock short for teachers submitting meanwhile
+        for offset in range(0, len(rows), chunk_rows):
+            chunk = rows[offset:offset + chunk_rows]
+            with self.storage._write_lock, self.storage.connect() as db:
+                db.executemany(
+                    "INSERT INTO attendance (date, student_name, class, teacher, parent1, status) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", [tuple(row) for row in chunk])
+                self.storage._bump_log_version(db)
+            if progress:
+                progress(offset + len(chunk))
+
+    def iter_chunks(self, chunk_rows=CHUNK_ROWS, start=None, end=None):
+        # The date index plays the role of the Sheets month partitions
+        last_id = 0
+        db = self.storage.connect()
+        while True:
+            rows = db.execute(
+                "SELECT id, date, student_name, class, teacher, parent1, status FROM attendance "
+                "WHERE id > ? AND date >= ? AND date <= ? ORDER BY id LIMIT ?",
+                (last_id, start or "", end or "9999-12-31", chunk_rows)).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield typed_log(pd.DataFrame([row[1:] for row in rows], columns=LOG_HEADERS))
+
+
+class SQLiteAggregates:
+    """SQLite counterpart of StudentAggregates, backed by the summary table."""
+
+    # Reads never fall back to an old copy here
+    stale_since = None
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def due(self):
+        # Reads go straight to the table; nothing is worth fetching ahead of time
+        return False
+
+    def get(self, name, class_name, parent1):
+        row = self.storage.connect().execute(
+            "SELECT present, absent, no_class, last_seen FROM summary "
+            "WHERE student_name = ? AND class = ? AND parent1 = ?", (name, class_name, parent1)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(COUNT_COLUMNS + ["Last Seen"], row))
+
+    def apply(self, added, removed=()):
+        columns = {"Present": "present", "Absent": "absent", "No Class": "no_class"}
+        with self.storage._write_lock, self.storage.connect() as db:
+            for row, sign in [(r, 1) for r in added] + [(r, -1) for r in removed]:
+                key = (row[1], row[2], row[4])
+                db.execute("INSERT OR IGNORE INTO summary (student_name, class, parent1) VALUES (?, ?, ?)", key)
+                column = columns.get(row[5])
+                if column:
+                    db.execute(f"UPDATE summary SET {column} = {column} + ? "
+                               "WHERE student_name = ? AND class = ? AND parent1 = ?", (sign,) + key)
+                if sign > 0:
+                    db.execute("UPDATE summary SET last_seen = max(last_seen, ?) "
+                               "WHERE student_name = ? AND class = ? AND parent1 = ?", (row[0],) + key)
+
+    def rebuild(self):
+        with self.storage._write_lock, self.storage.connect() as db:
+            db.execute("DELETE FROM summary")
+            db.execute("""
+                INSERT INTO summary (student_name, class, parent1, present, absent, no_class, last_seen)
+                SELECT student_name, class, parent1,
+                       SUM(status = 'Present'), SUM(status = 'Absent'), SUM(status = 'No Class'), MAX(date)
+                FROM attendance GROUP BY student_name, class, parent1
+            """)
+
+
+def open_storage(settings, sheets_client_factory=None, roster_spreadsheet_id=None, log_spreadsheet_id=None,
+                 shared=None):
+    """Build the engine named by ``settings["backend"]`` ("sheets" or "sqlite")."""
+    backend = settings.get("backend", "sheets")
+    if backend == "sqlite":
+        return SQLiteStorage(settings.get("path", DEFAULT_DB_PATH))
+    if backend == "sheets":
+        return SheetsStorage(sheets_client_factory(), roster_spreadsheet_id, log_spreadsheet_id, shared=shared)
+    raise ValueError(f"Unknown storage backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load a roster CSV into the local SQLite storage engine.")
+    parser.add_argument("roster_csv", help="CSV export of the 'S1 - Student Details' sheet")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help=f"database file (default: {DEFAULT_DB_PATH})")
+    args = parser.parse_args()
+
+    roster = pd.read_csv(args.roster_csv, dtype=str, keep_default_na=False)
+    SQLiteStorage(args.db).replace_roster([roster.columns.tolist()] + roster.values.tolist())
+    print(f"Loaded {len(roster)} students into {args.db}")
@@ -401,19 +401,27 @@
 #             st.success("✅ Attendance submitted!")
 
 import streamlit as st
-import pandas as pd
 from datetime import date
 import os
 import json
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
+import threading
+# Only what the login form needs is imported up front; pandas, the Google client and the data
+# modules are imported by the warm-up thread and, after login, below the sidebar
+from instrumentation import METRICS, SHEETS_QUOTA_PER_MINUTE, span
 
 # --- Page Setup ---
 st.set_page_config(page_title="Student Attendance Tracker", layout="wide")
 
+# Time every rerun; a rerun cut short by st.rerun() is closed when the next one starts
+st.session_state.perf_rerun = METRICS.start_rerun(st.session_state.get("perf_rerun"))
+
 # Google Sheets API Setup
 SPREADSHEET_ID = '1dwju2Um-3RXlaOKwRS7jaNEmIXBGMIbMxIOv4t5Lpnw'  # Replace with actual sheet ID
-SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+SPREADSHEET_ID_2 = "1iZHggnfAjbNPZD_lV0fDCLmbVc1s7Kj0vCZYm5YLPtY"  # Attendance log
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive.metadata.readonly']
+
+# Students shown per page of the Mark Attendance grid
+MARK_PAGE_SIZE = 100
 
 # Initialize Session State for Login
 if 'logged_in' not in st.session_state:
@@ -422,40 +430,202 @@ if 'user_role' not in st.session_state:
     st.session_state.user_role = None
 if 'user_phone' not in st.session_state:
     st.session_state.user_phone = None
-if 'auth_students' not in st.session_state:
-    st.session_state.auth_students = None
-
-# Load student data from Google Sheets (no cache)
-def load_data():
+# Keys of the students a parent may see; resolved against the shared roster on every rerun
+if 'auth_keys' not in st.session_state:
+    st.session_state.auth_keys = ()
+
+# One authorized client per server process; token refresh and connection pooling live in SheetsClient
+@st.cache_resource(show_spinner=False)
+def get_sheets_client():
+    from sheets_client import SheetsClient
+    # Accessing creds directly from secrets
+    creds_dict = dict(st.secrets["gcp_service_account"])
+    return SheetsClient(creds_dict, SCOPES)
+
+# Storage engine: [storage] in secrets.toml (backend = "sheets" or "sqlite", path = "attendance.db"),
+# overridden by the ATTENDANCE_STORAGE / ATTENDANCE_DB environment variables
+def storage_settings():
+    settings = {}
     try:
-        # Accessing creds directly from secrets
-        creds_dict = st.secrets["gcp_service_account"]
-        creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-        service = build('sheets', 'v4', credentials=creds)
-        sheet = service.spreadsheets()
-
-        result = sheet.values().get(
-            spreadsheetId=SPREADSHEET_ID,
-            range='S1 - Student Details'
-        ).execute()
-
-        values = result.get('values', [])
-        if not values:
-            st.error("❌ No data found.")
-            st.stop()
-
-        df = pd.DataFrame(values[1:], columns=values[0])
-
-        for col in ['Parents Number 1', 'Parents Number 2', "Teacher Phone Number", "Password"]:
-            if col in df.columns:
-                df[col] = df[col].astype(str).str.replace(".0", "", regex=False).str.strip()
-        return df
-
+        settings.update(st.secrets.get("storage", {}))
+    except FileNotFoundError:
+        pass
+    if os.environ.get("ATTENDANCE_STORAGE"):
+        settings["backend"] = os.environ["ATTENDANCE_STORAGE"]
+    if os.environ.get("ATTENDANCE_DB"):
+        settings["path"] = os.environ["ATTENDANCE_DB"]
+    return settings
+
+# Cache shared by all server processes: [shared_cache] in secrets.toml (backend = "none", "file" or
+# "redis", path = ".attendance-cache", url = "redis://localhost:6379/0"), overridden by the
+# ATTENDANCE_SHARED_CACHE / ATTENDANCE_SHARED_CACHE_PATH / ATTENDANCE_SHARED_CACHE_URL environment variables
+def shared_cache_settings():
+    settings = {}
+    try:
+        settings.update(st.secrets.get("shared_cache", {}))
+    except FileNotFoundError:
+        pass
+    if os.environ.get("ATTENDANCE_SHARED_CACHE"):
+        settings["backend"] = os.environ["ATTENDANCE_SHARED_CACHE"]
+    if os.environ.get("ATTENDANCE_SHARED_CACHE_PATH"):
+        settings["path"] = os.environ["ATTENDANCE_SHARED_CACHE_PATH"]
+    if os.environ.get("ATTENDANCE_SHARED_CACHE_URL"):
+        settings["url"] = os.environ["ATTENDANCE_SHARED_CACHE_URL"]
+    return settings
+
+@st.cache_resource(show_spinner=False)
+def get_storage():
+    from storage import open_storage
+    from shared_cache import open_shared_cache
+    return open_storage(storage_settings(), get_sheets_client, SPREADSHEET_ID, SPREADSHEET_ID_2,
+                        shared=open_shared_cache(shared_cache_settings()))
+
+# Incremental writer for the attendance log; keeps its date -> rows index between submits
+def get_attendance_log():
+    return get_storage().log
+
+# Per-student Present/Absent counts, updated by delta on every submit
+def get_student_aggregates():
+    return get_storage().aggregates
+
+# Absence messages to parents: [notifications] in secrets.toml (backend = "none", "file" or "http",
+# path = "notifications.jsonl", url = ..., token = ..., per_minute = 600), overridden by the
+# ATTENDANCE_NOTIFY / ATTENDANCE_NOTIFY_PATH / ATTENDANCE_NOTIFY_URL environment variables
+def notification_settings():
+    settings = {}
+    try:
+        settings.update(st.secrets.get("notifications", {}))
+    except FileNotFoundError:
+        pass
+    if os.environ.get("ATTENDANCE_NOTIFY"):
+        settings["backend"] = os.environ["ATTENDANCE_NOTIFY"]
+    if os.environ.get("ATTENDANCE_NOTIFY_PATH"):
+        settings["path"] = os.environ["ATTENDANCE_NOTIFY_PATH"]
+    if os.environ.get("ATTENDANCE_NOTIFY_URL"):
+        settings["url"] = os.environ["ATTENDANCE_NOTIFY_URL"]
+    return settings
+
+# None when notifications are off
+@st.cache_resource
+def get_absence_notifier():
+    from notifications import open_gateway, AbsenceNotifier
+    settings = notification_settings()
+    gateway = open_gateway(settings)
+    if gateway is None:
+        return None
+    return AbsenceNotifier(gateway, roster=get_roster_cache().get, per_minute=int(settings.get("per_minute", 600)))
+
+# Background writer shared by all teachers; submissions are batched and retried there
+@st.cache_resource
+def get_submission_queue():
+    from write_queue import SubmissionQueue
+    notifier = get_absence_notifier()
+    return SubmissionQueue(get_storage(), on_written=notifier.enqueue if notifier else None)
+
+SUBMISSION_LABELS = {"queued": "⏳ Queued", "writing": "✍️ Saving", "retrying": "🔁 Retrying",
+                     "done": "✅ Saved", "failed": "❌ Failed"}
+
+def show_submission_status():
+    submission_queue = get_submission_queue()
+    for submission_id in reversed(st.session_state.get("submissions", [])[-5:]):
+        status = submission_queue.status(submission_id)
+        if status is None:
+            continue
+        line = f"{SUBMISSION_LABELS[status['state']]} · {status['date']} · {status['rows']} students"
+        if status["error"]:
+            line += f" · {status['error']}"
+        st.caption(line)
+    notifier = get_absence_notifier()
+    if notifier is not None and st.session_state.get("submissions"):
+        counts = notifier.counts()
+        waiting = counts.get("queued", 0) + counts.get("sending", 0) + counts.get("retrying", 0)
+        st.caption(f"📨 Absence messages · {counts.get('sent', 0)} sent · {waiting} waiting · "
+                   f"{counts.get('failed', 0)} failed")
+
+# School-wide dashboard tables, recomputed only when the log version moves
+@st.cache_resource
+def get_school_analytics():
+    from analytics import SchoolAnalytics
+    storage = get_storage()
+    return SchoolAnalytics(storage.log, storage.log_version, shared=storage.shared)
+
+# Per-student history sorted by date, rebuilt only when the log version moves
+@st.cache_resource
+def get_student_history():
+    from history import StudentHistory
+    storage = get_storage()
+    return StudentHistory(storage.log, storage.log_version, shared=storage.shared)
+
+# One roster cache per server process, shared by every session
+@st.cache_resource(show_spinner=False)
+def get_roster_cache():
+    from roster import RosterCache, ROSTER_TTL
+    storage = get_storage()
+    return RosterCache(storage.roster_values, storage.roster_version, ttl=ROSTER_TTL, shared=storage.shared)
+
+# From the first data load on, this thread keeps a snapshot of its GET responses for the rest of
+# the rerun (see SheetsClient.begin_rerun); every way out of the script, st.rerun() and st.stop()
+# included, has to drop it again
+rerun_snapshot = False
+
+def end_rerun_snapshot():
+    global rerun_snapshot
+    if rerun_snapshot:
+        get_storage().end_rerun()
+        rerun_snapshot = False
+
+# The summary page needs the roster and the summary tab, which sit in different spreadsheets;
+# when both are due for a refresh they are fetched side by side instead of one after the other
+def prefetch_page():
+    global rerun_snapshot
+    storage = get_storage()
+    storage.begin_rerun()
+    rerun_snapshot = True
+    roster_cache = get_roster_cache()
+    summary_page = st.session_state.get("page_mode", "📊 View Attendance Summary") == "📊 View Attendance Summary"
+    if st.session_state.logged_in and summary_page and roster_cache.due() and storage.aggregates.due():
+        try:
+            with span("prefetch"):
+                storage.run_parallel([roster_cache.get, storage.aggregates.refresh])
+        except Exception:
+            # Best effort; the regular loads below report any error where they always have
+            pass
+
+# Load student data from Google Sheets (cached, re-downloaded only when the sheet changes);
+# ``read`` picks what to take from the roster cache, the whole roster by default
+def load_data(read=None):
+    try:
+        prefetch_page()
+        return (read or get_roster_cache().get)()
+    except ValueError:
+        st.error("❌ No data found.")
+        end_rerun_snapshot()
+        st.stop()
     except Exception as e:
         st.error(f"❌ Error loading data from Google Sheets: {e}")
+        end_rerun_snapshot()
         st.stop()
 
-students = load_data()
+# Run once per server process, in the background, by the first visitor's rerun: import the data
+# modules, build the Sheets client and download the roster with its login index, so the login
+# form is never held up and the first login is a lookup. The accessors it calls have no spinner,
+# since the thread has no page to draw one on
+def warm_up():
+    try:
+        with span("warm-up"):
+            import pandas, analytics, history, importer, reports  # noqa: F401
+            get_roster_cache().get()
+    except Exception:
+        # The login submit loads the roster again and reports the error there
+        pass
+
+@st.cache_resource
+def start_warm_up():
+    thread = threading.Thread(target=warm_up, name="attendance-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+start_warm_up()
 
 # --- SIDEBAR LOGIC ---
 st.sidebar.title("Attendance Portal")
@@ -477,23 +647,22 @@ if not st.session_state.logged_in:
         if not phone_input:
             st.sidebar.error("Please enter a phone number.")
         else:
-            user_record = students[
-                (students["Parents Number 1"] == phone_input) |
-                (students["Parents Number 2"] == phone_input) |
-                (students.get("Teacher Phone Number", "") == phone_input)
-            ]
+            # One hash lookup in the login index; the roster is first needed here, and the
+            # warm-up has usually downloaded it already
+            with span("login lookup"):
+                match = load_data(lambda: get_roster_cache().lookup_phone(phone_input))
 
-            if user_record.empty:
+            if match is None:
                 st.sidebar.error("❌ Phone number not found.")
             else:
-                record_count = len(user_record)
-                is_teacher_num = (students.get('Teacher Phone Number', "") == phone_input).any()
+                login_role, user_record = match
 
                 # Teacher Logic: Bypass password if > 1 record or flagged as teacher
-                if record_count > 1 or is_teacher_num:
+                if login_role == "Teacher":
                     st.session_state.logged_in = True
                     st.session_state.user_role = "Teacher"
                     st.session_state.user_phone = phone_input
+                    end_rerun_snapshot()
                     st.rerun()
                 else:
                     # Parent Logic: Check Password
@@ -502,12 +671,16 @@ if not st.session_state.logged_in:
                         st.session_state.logged_in = True
                         st.session_state.user_role = "Parent"
                         st.session_state.user_phone = phone_input
-                        st.session_state.auth_students = user_record
+                        from roster import student_keys
+                        st.session_state.auth_keys = tuple(student_keys(user_record))
+                        end_rerun_snapshot()
                         st.rerun()
                     else:
                         st.sidebar.error("❌ Incorrect Password.")
 
     st.info("👋 Welcome! Please login in the sidebar to access the tracker.")
+    METRICS.finish_rerun()
+    end_rerun_snapshot()
     st.stop() # Prevent app from running until logged in
 
 else:
@@ -516,29 +689,62 @@ else:
     if st.sidebar.button("Logout"):
         st.session_state.logged_in = False
         st.session_state.user_role = None
+        st.session_state.auth_keys = ()
+        end_rerun_snapshot()
         st.rerun()
 
     role = st.session_state.user_role
     phone_input = st.session_state.user_phone
 
     if role == "Parent":
-        mode = st.sidebar.radio("Choose Mode", ["📊 View Attendance Summary"])
+        mode = st.sidebar.radio("Choose Mode", ["📊 View Attendance Summary"], key="page_mode")
     else:
-        mode = st.sidebar.radio("Choose Mode", ["📊 View Attendance Summary", "📝 Mark Attendance"])
+        mode = st.sidebar.radio("Choose Mode", ["📊 View Attendance Summary", "📝 Mark Attendance", "📥 Import Attendance",
+                                              "🗂️ Report Cards", "📈 School Analytics", "⏱️ Performance"],
+                                key="page_mode")
+        # Pick up roster edits straight away instead of waiting for the cache TTL
+        if st.sidebar.button("🔄 Refresh Roster"):
+            get_roster_cache().invalidate()
+            end_rerun_snapshot()
+            st.rerun()
+    METRICS.set_mode(mode)
+
+# Logged in: the pages need the data modules (already imported by the warm-up) and the roster
+from collections import Counter
+import pandas as pd
+from attendance_log import LOG_HEADERS, build_log_rows
+from roster import student_keys
+from write_queue import DONE, FAILED
+from analytics import CHRONIC_ABSENCE_THRESHOLD
+from importer import drop_existing, import_rows, read_upload, validate
+from reports import REPORT_FORMATS, build_report_zip
+from history import HISTORY_PAGE_SIZE, period_start
+from scheduler import SheetsUnavailable
+
+with span("roster load"):
+    students = load_data()
 
 # --- View Attendance Summary ---
 if mode == "📊 View Attendance Summary":
     st.title("📊 Attendance Summary")
     if role == "Parent":
-        student_list = st.session_state.auth_students["Student Name"].dropna().unique().tolist()
+        candidates = get_roster_cache().students(st.session_state.auth_keys)
     else:
-        student_list = students["Student Name"].dropna().unique().tolist()
-
-    selected_student = st.selectbox("Select Student", student_list)
-
-    if selected_student:
+        candidates = students
+    candidates = candidates.dropna(subset=["Student Name"])
+
+    # One entry per roster row; children sharing a name are told apart by class, then parent number
+    keys = student_keys(candidates)
+    names = Counter(name for name, _, _ in keys)
+    classes = Counter((name, class_name) for name, class_name, _ in keys)
+    labels = [name if names[name] == 1 else f"{name} ({class_name})" if classes[(name, class_name)] == 1
+              else f"{name} ({class_name}, {parent1})" for name, class_name, parent1 in keys]
+    choice = st.selectbox("Select Student", range(len(keys)), format_func=labels.__getitem__)
+
+    if choice is not None:
         st.markdown("---")
-        info = students[students["Student Name"] == selected_student].iloc[0]
+        info = candidates.iloc[choice]
+        selected_student = info["Student Name"]
         col1, col2 = st.columns(2)
         with col1:
             st.info(f"**Student Name:** {selected_student}\n\n**Class:** {info['Class']}")
@@ -546,36 +752,46 @@ if mode == "📊 View Attendance Summary":
             st.info(f"**Teacher:** {info['Teacher Name']}\n\n**Parent 1:** {info['Parents Number 1']}")
 
         try:
-            SPREADSHEET_ID_2 = "1iZHggnfAjbNPZD_lV0fDCLmbVc1s7Kj0vCZYm5YLPtY"
-            
-            # ACCESS CREDS FROM SECRETS EVERY TIME
-            creds_dict = st.secrets["gcp_service_account"]
-            creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-            service = build('sheets', 'v4', credentials=creds)
-            
-            result = service.spreadsheets().values().get(
-                spreadsheetId=SPREADSHEET_ID_2, range='Attendance Log!A1:Z1000'
-            ).execute()
-
-            values = result.get("values", [])
-            headers = values[0] if values else ["Date", "Student Name", "Class", "Teacher", "Parent 1", "Status"]
-            log = pd.DataFrame(values[1:], columns=headers) if len(values) > 1 else pd.DataFrame(columns=headers)
+            # Counts come from the materialized summary tab, not a scan of the log
+            with span("summary counts"):
+                stats = get_student_aggregates().get(selected_student, info['Class'], info['Parents Number 1'])
+            present = stats["Present"] if stats else 0
+            absent = stats["Absent"] if stats else 0
+            total = present + absent
 
-            student_log = log[(log["Student Name"] == selected_student) & (log["Status"] != "No Class")]
-
-            if not student_log.empty:
-                present = student_log['Status'].value_counts().get('Present', 0)
-                absent = student_log['Status'].value_counts().get('Absent', 0)
-                total = present + absent
-                percent = (present / total) * 100 if total else 0
+            if total:
+                percent = (present / total) * 100
 
                 st.metric("✅ Present", present)
                 st.metric("❌ Absent", absent)
                 st.progress(percent / 100)
                 st.write(f"**Attendance %:** `{percent:.2f}%`")
-                st.dataframe(student_log[['Date', 'Status']].sort_values('Date', ascending=False))
+                st.caption(f"Last seen: {stats['Last Seen']}")
+                if get_student_aggregates().stale_since:
+                    st.caption("⚠️ Google Sheets is busy; these counts may be a few minutes old.")
+
+                # The dated history comes from the shared date index; only the visible page is sent
+                if st.toggle("📅 Show daily history"):
+                    period = st.radio("Period", ["Last 30 days", "This term", "This year", "All"], horizontal=True)
+                    start = period_start(period)
+                    start = start.strftime("%Y-%m-%d") if start else None
+                    key = (selected_student, info['Class'], info['Parents Number 1'])
+                    with span("summary history"):
+                        history = get_student_history().get()
+                    days = history.count(key, start)
+                    page_count = max(1, -(-days // HISTORY_PAGE_SIZE))
+                    history_page = st.number_input("Page", 1, page_count, 1, key="history_page") if page_count > 1 else 1
+                    _, student_log = history.page(key, start, page=history_page)
+                    st.dataframe(student_log, hide_index=True,
+                                 column_config={"Date": st.column_config.DateColumn("Date", format="YYYY-MM-DD")})
+                    st.caption(f"{days} days · page {history_page} of {page_count}")
+                    if get_student_history().stale_since:
+                        st.caption("⚠️ Google Sheets is busy; the latest days may be missing.")
             else:
                 st.warning("No attendance records found.")
+        except SheetsUnavailable:
+            # Only reached when there is no earlier copy to fall back to
+            st.warning("⏳ Google Sheets is busy right now; please try again in a minute.")
         except Exception as e:
             st.warning(f"Attendance log could not be loaded: {e}")
 
@@ -584,39 +800,245 @@ elif mode == "📝 Mark Attendance":
     st.title("📝 Mark Attendance")
     selected_date = st.date_input("📅 Date", date.today())
     today = selected_date.strftime("%Y-%m-%d")
-    
-    attendance_status = {}
-    for _, row in students.iterrows():
-        unique_key = f"{row['Student Name']}_{row['Class']}_{row['Parents Number 1']}"
-        status = st.radio(f"{row['Student Name']} ({row['Class']})", 
-                         ["Present", "Absent", "No Class"], index=2, key=unique_key, horizontal=True)
-        attendance_status[unique_key] = {"Name": row['Student Name'], "Class": row['Class'], "P1": row['Parents Number 1'], "Status": status}
+
+    # Marks for the selected date survive filter and page changes until submit
+    if st.session_state.get("marks_date") != today:
+        st.session_state.marks_date = today
+        st.session_state.marks = {}
+        st.session_state.editor_version = 0
+
+    # Default to the logged-in teacher's own students, filterable by class
+    if "Teacher Phone Number" in students.columns:
+        own = students[students["Teacher Phone Number"] == phone_input]
+    else:
+        own = students.iloc[0:0]
+    scope_options = ["My students", "All students"] if not own.empty else ["All students"]
+    col1, col2 = st.columns(2)
+    with col1:
+        scope = st.radio("Students", scope_options, horizontal=True)
+    roster = own if scope == "My students" else students
+    with col2:
+        class_options = ["All classes"] + sorted(roster["Class"].dropna().unique().tolist())
+        selected_class = st.selectbox("Class", class_options)
+    if selected_class != "All classes":
+        roster = roster[roster["Class"] == selected_class]
+
+    keys = (roster["Student Name"].astype(str) + "_" + roster["Class"].astype(str) + "_"
+            + roster["Parents Number 1"].astype(str)).tolist()
+    marks = st.session_state.marks
+
+    # Batch actions apply to every student in the current scope, not just the visible page
+    b1, b2, b3 = st.columns(3)
+    for column, label, status in [(b1, "✅ Mark all Present", "Present"),
+                                  (b2, "❌ Mark all Absent", "Absent"),
+                                  (b3, "↩️ Reset to No Class", "No Class")]:
+        if column.button(label):
+            marks.update({key: status for key in keys})
+            st.session_state.editor_version += 1
+
+    page_count = max(1, -(-len(roster) // MARK_PAGE_SIZE))
+    page = st.number_input("Page", 1, page_count, 1) if page_count > 1 else 1
+    page_slice = slice((page - 1) * MARK_PAGE_SIZE, page * MARK_PAGE_SIZE)
+    page_keys = keys[page_slice]
+
+    grid = roster[["Student Name", "Class"]].iloc[page_slice].reset_index(drop=True)
+    grid["Status"] = [marks.get(key, "No Class") for key in page_keys]
+    edited = st.data_editor(
+        grid,
+        column_config={"Status": st.column_config.SelectboxColumn(
+            "Status", options=["Present", "Absent", "No Class"], required=True)},
+        disabled=["Student Name", "Class"],
+        hide_index=True,
+        key=f"marks_{scope}_{selected_class}_{page}_{st.session_state.editor_version}",
+    )
+    marks.update(zip(page_keys, edited["Status"].tolist()))
+    st.caption(f"{len(roster)} students in view")
 
     if st.button("✅ Submit Attendance"):
-        SPREADSHEET_ID_2 = "1iZHggnfAjbNPZD_lV0fDCLmbVc1s7Kj0vCZYm5YLPtY"
-        
-        # ACCESS CREDS FROM SECRETS EVERY TIME
-        creds_dict = st.secrets["gcp_service_account"]
-        creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-        service = build('sheets', 'v4', credentials=creds)
-        sheet = service.spreadsheets()
-        
-        # Load existing to prevent duplicates for same day
-        res = sheet.values().get(spreadsheetId=SPREADSHEET_ID_2, range='Attendance Log!A1:Z1000').execute()
-        vals = res.get("values", [])
-        headers = vals[0] if vals else ["Date", "Student Name", "Class", "Teacher", "Parent 1", "Status"]
-        existing_df = pd.DataFrame(vals[1:], columns=headers) if len(vals) > 1 else pd.DataFrame(columns=headers)
-        
-        # Remove today's old data if updating
-        existing_df = existing_df[existing_df["Date"] != today]
-
-        new_entries = []
-        for entry in attendance_status.values():
-            t_search = students[students["Student Name"] == entry["Name"]]
-            teacher = t_search['Teacher Name'].values[0] if not t_search.empty else "Unknown"
-            new_entries.append([today, entry["Name"], entry["Class"], teacher, entry["P1"], entry["Status"]])
-
-        final_data = [headers] + existing_df.values.tolist() + new_entries
-        sheet.values().update(spreadsheetId=SPREADSHEET_ID_2, range="Attendance Log!A1", 
-                             valueInputOption="RAW", body={"values": final_data}).execute()
+        # One keyed merge against the roster fills in every student's teacher
+        marks_df = roster[["Student Name", "Class", "Parents Number 1"]].copy()
+        marks_df["Status"] = [marks.get(key, "No Class") for key in keys]
+        with span("submit build rows"):
+            new_entries = build_log_rows(today, marks_df, students)
+
+        # Queued for the background writer, which appends new students for the date
+        # or overwrites only their existing rows
+        with span("submit enqueue"):
+            submission_id = get_submission_queue().submit(today, new_entries)
+        st.session_state.setdefault("submissions", []).append(submission_id)
         st.success("✅ Attendance submitted!")
+
+    # Poll while any of this session's submissions is still being written
+    in_flight = any(
+        (get_submission_queue().status(sid) or {}).get("state") not in (DONE, FAILED, None)
+        for sid in st.session_state.get("submissions", [])
+    )
+    st.fragment(show_submission_status, run_every=2 if in_flight else None)()
+
+# --- Import Attendance (Teacher Only) ---
+elif mode == "📥 Import Attendance":
+    st.title("📥 Import Attendance")
+    st.caption("CSV or Excel with the columns " + ", ".join(LOG_HEADERS) + ". "
+               "Teacher and Parent 1 are filled in from the roster when left out.")
+    upload = st.file_uploader("Attendance file", type=["csv", "xlsx", "xls"])
+
+    if upload is None:
+        st.session_state.pop("import_check", None)
+    else:
+        # Validation reads the log for the file's date range, so it runs once per uploaded file
+        check = st.session_state.get("import_check")
+        if check is None or check["file_id"] != upload.file_id:
+            check = {"file_id": upload.file_id, "error": None}
+            try:
+                with span("import validate"):
+                    rows, check["rejected"] = validate(read_upload(upload, upload.name), students)
+                    check["new"], check["recorded"] = drop_existing(rows, get_attendance_log())
+            except ValueError as e:
+                check["error"] = str(e)
+            st.session_state.import_check = check
+
+        if check["error"]:
+            st.error(f"❌ {check['error']}")
+        else:
+            new_rows, recorded, rejected = check["new"], check["recorded"], check["rejected"]
+            col1, col2, col3 = st.columns(3)
+            col1.metric("🆕 New rows", len(new_rows))
+            col2.metric("♻️ Already recorded", len(recorded))
+            col3.metric("⚠️ Rejected", len(rejected))
+            if not rejected.empty:
+                st.dataframe(rejected.head(1000), hide_index=True)
+                st.download_button("⬇️ Download rejected rows", rejected.to_csv(index=False),
+                                   file_name="rejected.csv", mime="text/csv")
+
+            if new_rows.empty:
+                st.info("Nothing new to import.")
+            elif st.button(f"📥 Import {len(new_rows)} rows"):
+                bar = st.progress(0.0, text="Writing…")
+
+                def show_progress(written):
+                    bar.progress(written / len(new_rows), text=f"{written} of {len(new_rows)} rows written")
+
+                try:
+                    with span("import write"):
+                        import_rows(get_storage(), new_rows, progress=show_progress)
+                    st.success(f"✅ Imported {len(new_rows)} rows.")
+                    check["recorded"] = pd.concat([recorded, new_rows], ignore_index=True)
+                    check["new"] = new_rows.iloc[0:0]
+                except Exception as e:
+                    # Whatever was written stays; checking the file again skips those rows
+                    st.error(f"❌ Import stopped: {e}. Rows already written are kept and skipped when you import again.")
+                    st.session_state.pop("import_check", None)
+
+# --- Report Cards (Teacher Only) ---
+elif mode == "🗂️ Report Cards":
+    st.title("🗂️ Report Cards")
+    st.caption("One report per student with counts, attendance % and the dated history, zipped by class.")
+    col1, col2 = st.columns(2)
+    with col1:
+        term_start = st.date_input("From", date(date.today().year, 1, 1))
+    with col2:
+        term_end = st.date_input("To", date.today())
+    class_options = ["All classes"] + sorted(students["Class"].dropna().unique().tolist())
+    report_class = st.selectbox("Class", class_options)
+    formats = st.multiselect("Formats", list(REPORT_FORMATS), default=["csv", "html"])
+
+    report_roster = students if report_class == "All classes" else students[students["Class"] == report_class]
+    if st.button(f"🗂️ Generate {len(report_roster)} report cards", disabled=not formats):
+        bar = st.progress(0.0, text="Reading the attendance log…")
+
+        def show_progress(done, total):
+            bar.progress(done / total, text=f"{done} of {total} report cards")
+
+        try:
+            start, end = term_start.strftime("%Y-%m-%d"), term_end.strftime("%Y-%m-%d")
+            # One read of the log for the whole term, shared by every card
+            st.session_state.report_zip = build_report_zip(
+                get_attendance_log().iter_chunks(start=start, end=end), report_roster, formats,
+                progress=show_progress)
+            st.session_state.report_name = f"report_cards_{start}_{end}.zip"
+        except Exception as e:
+            st.error(f"❌ Report cards could not be generated: {e}")
+
+    if st.session_state.get("report_zip"):
+        st.download_button("⬇️ Download report cards", st.session_state.report_zip,
+                           file_name=st.session_state.report_name, mime="application/zip")
+
+# --- School Analytics (Teacher Only) ---
+elif mode == "📈 School Analytics":
+    st.title("📈 School Analytics")
+    try:
+        with span("analytics"):
+            analytics = get_school_analytics().get()
+    except SheetsUnavailable:
+        st.warning("⏳ Google Sheets is busy right now; please try again in a minute.")
+        analytics = None
+    except Exception as e:
+        st.warning(f"Attendance log could not be loaded: {e}")
+        analytics = None
+    if analytics is not None and get_school_analytics().stale_since:
+        st.caption("⚠️ Google Sheets is busy; these figures may be a few minutes old.")
+
+    if analytics is None:
+        pass
+    elif not analytics["days"]:
+        st.warning("No attendance records found.")
+    else:
+        col1, col2 = st.columns(2)
+        col1.metric("🏫 School attendance", f"{analytics['overall']:.1f}%")
+        col2.metric("📅 Marked student-days", analytics["days"])
+
+        st.subheader("By class")
+        st.dataframe(analytics["classes"], hide_index=True)
+        st.subheader("By teacher")
+        st.dataframe(analytics["teachers"], hide_index=True)
+
+        st.subheader("Month over month")
+        months = analytics["months"]
+        st.line_chart(months.set_index("Month")["Attendance %"])
+        st.dataframe(months, hide_index=True)
+
+        st.subheader("Chronic absence")
+        threshold = st.slider("Attendance below (%)", 50, 100, int(CHRONIC_ABSENCE_THRESHOLD * 100))
+        per_student = analytics["students"]
+        chronic = per_student[per_student["Attendance %"] < threshold].sort_values("Attendance %")
+        st.caption(f"{len(chronic)} of {len(per_student)} students")
+        st.dataframe(chronic, hide_index=True)
+
+        st.subheader("Longest absence streaks")
+        st.dataframe(analytics["streaks"].head(50), hide_index=True)
+
+# --- Performance (Teacher Only) ---
+elif mode == "⏱️ Performance":
+    st.title("⏱️ Performance")
+    st.caption("Latency of each stage of a rerun in this server process, by mode. "
+               "Sheets API traffic counts every session and the background writer.")
+
+    # Distance from the per-minute Sheets quota, rolling over the last 60 seconds
+    calls = METRICS.calls_last_minute()
+    col1, col2 = st.columns(2)
+    col1.metric("Sheets API calls (last minute)", calls)
+    col2.metric("Quota used", f"{calls / SHEETS_QUOTA_PER_MINUTE:.0%}")
+    if calls >= 0.8 * SHEETS_QUOTA_PER_MINUTE:
+        st.warning(f"⚠️ Close to the Sheets quota of {SHEETS_QUOTA_PER_MINUTE} requests per minute.")
+
+    # What the request scheduler did: reads saved by coalescing, retries after 429/5xx, give-ups
+    client = getattr(get_storage(), "client", None)
+    if client is not None:
+        scheduler = client.scheduler.stats()
+        cols = st.columns(5)
+        for col, name in zip(cols, ["sent", "coalesced", "retried", "throttled", "unavailable"]):
+            col.metric(f"Requests {name}", scheduler.get(name, 0))
+        st.caption(f"Request budget left this minute: {scheduler['budget left']} of {SHEETS_QUOTA_PER_MINUTE}")
+
+    stage_rows = METRICS.stage_table()
+    if stage_rows:
+        st.dataframe(pd.DataFrame(stage_rows), hide_index=True)
+    else:
+        st.info("No timings recorded yet.")
+
+    # One JSON record per rerun: mode, total ms, API calls, bytes and stage timings
+    st.download_button("⬇️ Export rerun log (JSONL)", METRICS.export_jsonl(),
+                       file_name="perf.jsonl", mime="application/x-ndjson")
+
+METRICS.finish_rerun()
+end_rerun_snapshot()
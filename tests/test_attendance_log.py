@@ -0,0 +1,52 @@
+from attendance_log import LOG_HEADERS, AttendanceLog
+from benchmarks.fake_sheets import FakeSheetsClient
+from partitions import PartitionedAttendanceLog
+
+CLASS = [("Asha", "222"), ("Ben", "444"), ("Cara", "666")]
+
+
+def rows(day, status="Present", students=CLASS):
+    return [[day, name, "5A", "Mr T", parent, status] for name, parent in students]
+
+
+def test_resubmitting_part_of_a_class_replaces_only_those_rows():
+    client = FakeSheetsClient()
+    log = AttendanceLog(client, "log", sheet="Attendance")
+    assert log.write_day("2026-10-05", rows("2026-10-05")) == []
+
+    replaced = log.write_day("2026-10-05", rows("2026-10-05", "Absent", CLASS[1:2]))
+
+    assert replaced == rows("2026-10-05", students=CLASS[1:2])
+    assert client.spreadsheet("log").tabs["Attendance"] == [LOG_HEADERS] + [
+        ["2026-10-05", "Asha", "5A", "Mr T", "222", "Present"],
+        ["2026-10-05", "Ben", "5A", "Mr T", "444", "Absent"],
+        ["2026-10-05", "Cara", "5A", "Mr T", "666", "Present"],
+    ]
+
+
+def test_a_new_month_gets_its_own_tab():
+    client = FakeSheetsClient()
+    log = PartitionedAttendanceLog(client, "log")
+    log.write_day("2026-10-30", rows("2026-10-30"))
+
+    assert log.write_day("2026-11-02", rows("2026-11-02", "Absent")) == []
+
+    tabs = client.spreadsheet("log").tabs
+    assert tabs["Attendance 2026-10"] == [LOG_HEADERS] + rows("2026-10-30")
+    assert tabs["Attendance 2026-11"] == [LOG_HEADERS] + rows("2026-11-02", "Absent")
+
+
+def test_rows_moved_by_hand_reset_the_index():
+    client = FakeSheetsClient()
+    log = AttendanceLog(client, "log", sheet="Attendance")
+    log.write_day("2026-10-06", rows("2026-10-06"))
+    log.write_day("2026-10-05", rows("2026-10-05"))
+    # A teacher sorts the tab by date, so the index's row numbers now hold the other day
+    tab = client.spreadsheet("log").tabs["Attendance"]
+    tab[1:] = sorted(tab[1:])
+
+    replaced = log.write_day("2026-10-06", rows("2026-10-06", "Absent", CLASS[:1]))
+
+    assert replaced == rows("2026-10-06", students=CLASS[:1])
+    assert tab == [LOG_HEADERS] + rows("2026-10-05") + rows("2026-10-06", "Absent", CLASS[:1]) + \
+        rows("2026-10-06", students=CLASS[1:])
@@ -0,0 +1,27 @@
+import pandas as pd
+
+from importer import validate
+
+ROSTER = pd.DataFrame({"Student Name": ["Asha"], "Class": ["5A"], "Parents Number 1": ["9876543210"],
+                       "Teacher Name": ["Ms. Rao"]})
+
+
+def upload(dates):
+    return pd.DataFrame({"Date": dates, "Student Name": "Asha", "Class": "5A", "Status": "Present"})
+
+
+def test_iso_dates_keep_their_month():
+    rows, rejected = validate(upload(["2026-10-05", "2026-03-01"]), ROSTER)
+    assert rows["Date"].tolist() == ["2026-03-01", "2026-10-05"]
+    assert rejected.empty
+
+
+def test_other_dates_are_day_first():
+    rows, _ = validate(upload(["05/10/2026", "13/01/2026"]), ROSTER)
+    assert rows["Date"].tolist() == ["2026-01-13", "2026-10-05"]
+
+
+def test_unreadable_dates_are_rejected():
+    rows, rejected = validate(upload(["soon"]), ROSTER)
+    assert rows.empty
+    assert rejected["Reason"].tolist() == ["Unreadable date"]
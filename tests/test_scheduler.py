@@ -0,0 +1,62 @@
+import threading
+from collections import namedtuple
+
+from scheduler import RequestScheduler
+
+Request = namedtuple("Request", ["method", "uri"])
+READ = Request("GET", "https://sheets/values/Attendance%20Summary")
+WRITE = Request("POST", "https://sheets/values:batchUpdate")
+
+
+def test_identical_reads_in_flight_are_sent_once():
+    scheduler = RequestScheduler()
+    release = threading.Event()
+    sent = []
+
+    def send(request):
+        sent.append(request)
+        release.wait(5)
+        return {"values": len(sent)}
+
+    first = threading.Thread(target=scheduler.run, args=(READ, send))
+    first.start()
+    while not sent:
+        pass
+    second = threading.Thread(target=scheduler.run, args=(READ, send))
+    second.start()
+    while scheduler.stats().get("coalesced", 0) == 0:
+        pass
+    release.set()
+    first.join()
+    second.join()
+    assert len(sent) == 1
+
+
+def test_a_read_after_a_write_does_not_join_an_older_read():
+    scheduler = RequestScheduler()
+    release = threading.Event()
+    reads = []
+    results = {}
+
+    def send(request):
+        if request.method != "GET":
+            return {}
+        reads.append(request)
+        if len(reads) == 1:
+            # The slow read went out before the write and answers with the old counts
+            release.wait(5)
+            return {"values": "before the write"}
+        return {"values": "after the write"}
+
+    slow = threading.Thread(target=lambda: results.setdefault("slow", scheduler.run(READ, send)))
+    slow.start()
+    while not reads:
+        pass
+    scheduler.run(WRITE, send)
+    results["after"] = scheduler.run(READ, send)
+    release.set()
+    slow.join()
+
+    assert results == {"slow": {"values": "before the write"}, "after": {"values": "after the write"}}
+    assert len(reads) == 2
+    assert "coalesced" not in scheduler.stats()
@@ -0,0 +1,126 @@
+import itertools
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from attendance_log import row_key
+
+# Seconds the worker keeps collecting submissions before writing them together
+BATCH_WINDOW = 1.0
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 1.0
+# Finished submissions remembered for status display
+STATUS_HISTORY = 1000
+
+QUEUED, WRITING, RETRYING, DONE, FAILED = "queued", "writing", "retrying", "done", "failed"
+
+
+class SubmissionQueue:
+    """Write-behind queue for Submit Attendance.
+
+    ``submit`` returns immediately with an id. A background thread collects
+    everything submitted within ``batch_window`` seconds, merges it per date
+    (the latest mark for a student wins) and writes each date with one
+    ``log.write_day`` plus one ``aggregates.apply``, so a burst of teachers
+    costs a handful of API calls. Failed writes are retried with jittered
+    exponential backoff; once a log write has had to be retried, the counts
+    are recounted from the log rather than patched with a delta.
+    ``status`` reports progress for the UI.
+    ``on_written(day, rows)``, if given, is called for every date once it is
+    saved (the absence notifier hooks in here).
+    """
+
+    def __init__(self, storage, batch_window=BATCH_WINDOW, max_attempts=MAX_ATTEMPTS,
+                 retry_delay=RETRY_BASE_DELAY, on_written=None):
+        self.storage = storage
+        self.on_written = on_written
+        self.batch_window = batch_window
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue()
+        self._ids = itertools.count(1)
+        self._status = OrderedDict()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+        self._worker.start()
+
+    def submit(self, day, rows):
+        submission_id = next(self._ids)
+        with self._lock:
+            self._status[submission_id] = {"state": QUEUED, "date": day, "rows": len(rows),
+                                           "attempts": 0, "error": None}
+            while len(self._status) > STATUS_HISTORY:
+                self._status.popitem(last=False)
+        self._queue.put((submission_id, day, rows))
+        return submission_id
+
+    def status(self, submission_id):
+        with self._lock:
+            status = self._status.get(submission_id)
+            return dict(status) if status else None
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        by_day = OrderedDict()
+        for submission_id, day, rows in batch:
+            ids, merged = by_day.setdefault(day, ([], OrderedDict()))
+            ids.append(submission_id)
+            for row in rows:
+                merged[row_key(row)] = row
+        for day, (ids, merged) in by_day.items():
+            self._write_day(ids, day, list(merged.values()))
+
+    def _write_day(self, ids, day, rows):
+        replaced = None
+        log_failed = False
+        for attempt in range(1, self.max_attempts + 1):
+            self._set(ids, state=WRITING, attempts=attempt)
+            try:
+                # Keep what the log write returned so a retry only redoes the aggregate update
+                if replaced is None:
+                    try:
+                        replaced = self.storage.log.write_day(day, rows)
+                    except Exception:
+                        log_failed = True
+                        raise
+                if log_failed:
+                    # The failed attempt may have been applied anyway (e.g. the response timed
+                    # out), so the retry saw our own rows as the old ones; recount instead
+                    self.storage.aggregates.rebuild()
+                else:
+                    self.storage.aggregates.apply(rows, replaced)
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    self._set(ids, state=FAILED, error=str(e))
+                    return
+                self._set(ids, state=RETRYING, error=str(e))
+                time.sleep(self.retry_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            else:
+                self._set(ids, state=DONE, error=None)
+                if self.on_written:
+                    self.on_written(day, rows)
+                return
+
+    def _set(self, ids, **changes):
+        with self._lock:
+            for submission_id in ids:
+                if submission_id in self._status:
+                    self._status[submission_id].update(changes)